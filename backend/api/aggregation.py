@@ -0,0 +1,134 @@
+"""Group-by aggregates over a dataset, served by /api/aggregate/<id>/.
+
+Aggregates are computed on the dataset's memory-mapped columns: rows are
+sorted by type code once and every metric is a ufunc.reduceat over the
+sorted column, so the cost is one sort plus one pass per metric. When the
+column store is missing and every requested metric has a SQL equivalent the
+query runs as a GROUP BY instead, served by the (dataset, type) index.
+"""
+import re
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, Sum
+
+from .columnar import get_columns, load_columns
+from .models import Equipment
+from .stats import PARAMETERS
+
+GROUP_BY_FIELDS = ('type',)
+BASIC_METRICS = ('count', 'sum', 'mean', 'std', 'min', 'max')
+DEFAULT_METRICS = ('count', 'mean', 'std', 'min', 'max')
+SQL_METRICS = {'sum': Sum, 'mean': Avg, 'min': Min, 'max': Max}
+PERCENTILE_RE = re.compile(r'^p(100|[1-9]?[0-9])$')
+
+
+def parse_list(value, default, allowed=None, name='value'):
+    if not value:
+        return list(default)
+    items = list(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+    if not items:
+        raise ValueError(f'No {name} given')
+    unknown = [item for item in items if allowed is not None and item not in allowed]
+    if unknown:
+        raise ValueError(f'Unknown {name} {unknown}; choose from {list(allowed)}')
+    return items
+
+
+def parse_metrics(value):
+    """Validate a ?metrics= list: the basic metrics plus percentiles p0..p100"""
+    metrics = parse_list(value, DEFAULT_METRICS, name='metrics')
+    unknown = [m for m in metrics if m not in BASIC_METRICS and not PERCENTILE_RE.match(m)]
+    if unknown:
+        raise ValueError(f'Unknown metrics {unknown}; choose from {list(BASIC_METRICS)} or percentiles like p50')
+    return metrics
+
+
+def parse_fields(value):
+    return parse_list(value, PARAMETERS, PARAMETERS, 'fields')
+
+
+def group_aggregates(values, codes, metrics):
+    """Per-group metrics for each array in `values`, grouped by integer `codes`.
+
+    Returns (present_codes, counts, {field: {metric: array}}) with one entry
+    per code that has at least one row, in ascending code order.
+    """
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    present = np.unique(sorted_codes)
+    starts = np.searchsorted(sorted_codes, present)
+    counts = np.diff(np.append(starts, len(sorted_codes)))
+    percentiles = [(m, float(m[1:])) for m in metrics if PERCENTILE_RE.match(m)]
+
+    results = {}
+    for field, column in values.items():
+        column = np.asarray(column, dtype=np.float64)[order]
+        sums = np.add.reduceat(column, starts)
+        means = sums / np.maximum(counts, 1)
+        field_result = {}
+        if 'sum' in metrics:
+            field_result['sum'] = sums
+        if 'mean' in metrics:
+            field_result['mean'] = means
+        if 'std' in metrics:
+            deviations = column - np.repeat(means, counts)
+            field_result['std'] = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+        if 'min' in metrics:
+            field_result['min'] = np.minimum.reduceat(column, starts)
+        if 'max' in metrics:
+            field_result['max'] = np.maximum.reduceat(column, starts)
+        if percentiles:
+            # Groups are contiguous after the sort; one percentile call per group
+            bounds = np.append(starts, len(column))
+            per_group = np.array([np.percentile(column[bounds[i]:bounds[i + 1]], [q for _, q in percentiles])
+                                  for i in range(len(starts))]).reshape(len(starts), len(percentiles))
+            for j, (name, _) in enumerate(percentiles):
+                field_result[name] = per_group[:, j]
+        results[field] = {metric: field_result[metric] for metric in metrics if metric in field_result}
+    return present, counts, results
+
+
+def aggregate_columns(columns, fields, metrics):
+    values = {field: getattr(columns, field) for field in fields}
+    present, counts, results = group_aggregates(values, columns.type_codes, metrics)
+    groups = []
+    for i, code in enumerate(present.tolist()):
+        group = {'type': columns.type_names[code]}
+        if 'count' in metrics:
+            group['count'] = int(counts[i])
+        for field in fields:
+            group[field] = {metric: float(array[i]) for metric, array in results[field].items()}
+        groups.append(group)
+    return sorted(groups, key=lambda g: g['type'])
+
+
+def aggregate_sql(dataset, fields, metrics):
+    annotations = {'group_count': Count('id')}
+    for field in fields:
+        for metric in metrics:
+            if metric in SQL_METRICS:
+                annotations[f'{field}_{metric}'] = SQL_METRICS[metric](field)
+    rows = (Equipment.objects.filter(dataset_id=dataset.id)
+            .values('type').annotate(**annotations).order_by('type'))
+    groups = []
+    for row in rows:
+        group = {'type': row['type']}
+        if 'count' in metrics:
+            group['count'] = row['group_count']
+        for field in fields:
+            group[field] = {metric: float(row[f'{field}_{metric}']) for metric in metrics if metric in SQL_METRICS}
+        groups.append(group)
+    return groups
+
+
+def aggregate_dataset(dataset, group_by, fields, metrics):
+    """Return the list of per-group aggregate dicts, ordered by group key"""
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f'Cannot group by {group_by!r}; choose from {list(GROUP_BY_FIELDS)}')
+    columns = load_columns(dataset.pk)
+    if columns is None and all(m == 'count' or m in SQL_METRICS for m in metrics):
+        return aggregate_sql(dataset, fields, metrics)
+    if columns is None:
+        columns = get_columns(dataset)
+    return aggregate_columns(columns, fields, metrics)
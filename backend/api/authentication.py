@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from rest_framework import authentication, exceptions
+
+TOKEN_SALT = 'api.authentication.SignedTokenAuthentication'
+DEFAULT_TOKEN_MAX_AGE = 12 * 60 * 60
+
+
+def get_token_max_age():
+    return getattr(settings, 'API_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
+
+
+def _password_fingerprint(user):
+    # HMAC of the password hash: changing the password revokes old tokens
+    return user.get_session_auth_hash()[:16]
+
+
+def issue_token(user):
+    """Return a signed, timestamped token identifying `user`"""
+    return signing.dumps({'uid': user.pk, 'pw': _password_fingerprint(user)}, salt=TOKEN_SALT)
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """Authenticate `Authorization: Bearer <token>` headers issued by login_view.
+
+    Verifying a token is an HMAC check plus one primary-key lookup, instead of
+    the PBKDF2 password hash BasicAuthentication runs on every request.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            payload = signing.loads(auth[1].decode(), salt=TOKEN_SALT, max_age=get_token_max_age())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        user = User.objects.filter(pk=payload.get('uid')).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        if not constant_time_compare(payload.get('pw', ''), _password_fingerprint(user)):
+            raise exceptions.AuthenticationFailed('Token has been revoked.')
+        return user, auth[1].decode()
+
+    def authenticate_header(self, request):
+        # Token clients are told to re-authenticate with a token; everyone
+        # else (the web frontend) keeps the Basic challenge
+        auth = authentication.get_authorization_header(request).split()
+        if auth and auth[0].lower() == self.keyword.lower().encode():
+            return self.keyword
+        return authentication.BasicAuthentication().authenticate_header(request)
@@ -0,0 +1,36 @@
+"""SQLite backend with per-connection PRAGMAs and IMMEDIATE write transactions.
+
+Two extra keys are read from DATABASES[...]['OPTIONS']:
+
+    pragmas             {name: value} applied to every new connection
+    transaction_mode    'DEFERRED', 'IMMEDIATE' or 'EXCLUSIVE' for atomic()
+
+With IMMEDIATE transactions a writer takes the write lock at BEGIN, where
+SQLite honours busy_timeout, instead of upgrading a read lock part-way
+through the transaction, which fails at once with "database is locked".
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        if self.transaction_mode not in (None, *TRANSACTION_MODES):
+            raise ValueError(f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}')
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
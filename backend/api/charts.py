@@ -0,0 +1,400 @@
+"""Chart rendering for PDF reports.
+
+Reports describe their charts as ChartSpecs and turn them into flowables in
+one call to chart_flowables(). In the default 'vector' REPORT_CHART_MODE
+charts are drawn as ReportLab Drawings, which the PDF stores as vector paths;
+everything else (and charts vector mode can't draw, see vector_supported) is
+rasterized by matplotlib at REPORT_CHART_DPI. Scatter and line series longer
+than LARGE_N_POINTS are first aggregated (aggregate_spec) into a density grid
+or a min/max envelope, so drawing cost depends on the output resolution
+rather than on the number of rows. Rasters are rendered by
+render_charts(), which fans the specs out over a pool of worker processes so
+a report costs roughly its slowest chart instead of the sum of all of them.
+This module deliberately avoids Django models so pool workers can import it
+without setting Django up, and avoids pyplot so it is safe to call from
+threaded workers.
+"""
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from django.conf import settings
+from io import BytesIO
+from matplotlib.colors import LogNorm
+from reportlab.graphics.charts.axes import XValueAxis, YValueAxis
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing, Group, Polygon, Rect, String
+from reportlab.graphics.widgets.markers import makeMarker
+from reportlab.lib import colors as pdf_colors
+from reportlab.platypus import Image
+
+MAX_DEFAULT_CHART_WORKERS = 4
+DEFAULT_CHART_MODE = 'vector'
+DEFAULT_CHART_DPI = 300
+CHART_MODES = ('vector', 'raster')
+# Above this many points a scatter is cheaper (and smaller) as a raster
+MAX_VECTOR_POINTS = 5000
+# Above this many points scatters become density grids and lines min/max envelopes
+LARGE_N_POINTS = 20000
+DENSITY_BINS = (60, 40)
+ENVELOPE_BUCKETS = 1000
+CHART_COLORS = ['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b', '#ef4444', '#10b981']
+
+ChartSpec = namedtuple('ChartSpec', ['data', 'chart_type', 'title', 'xlabel', 'ylabel', 'filename'])
+Box = namedtuple('Box', ['x', 'y', 'width', 'height'])
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def create_chart(data, chart_type, title, xlabel, ylabel, filename, dpi=DEFAULT_CHART_DPI):
+    """Create various types of charts and return as BytesIO object.
+
+    Uses a private Figure and Agg canvas rather than pyplot's global figure
+    stack, so charts can be rendered from several threads at once.
+    """
+    fig = Figure(figsize=(12, 8))  # Increased figure size
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    
+    if chart_type == 'bar':
+        bars = ax.bar(data['x'], data['y'], color=CHART_COLORS)
+        # Rotate x-axis labels for better readability
+        rotate_xticklabels(ax)
+        # Add value labels on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + max(data['y'])*0.01,
+                    f'{height:.1f}', ha='center', va='bottom', fontsize=10, fontweight='bold')
+    elif chart_type == 'line':
+        ax.plot(data['x'], data['y'], marker='o', linewidth=3, markersize=8, color='#60a5fa')
+        rotate_xticklabels(ax)
+    elif chart_type == 'scatter':
+        ax.scatter(data['x'], data['y'], alpha=0.7, s=80, color='#60a5fa', edgecolors='white', linewidth=1)
+    elif chart_type == 'density':
+        counts = np.ma.masked_equal(data['counts'].T, 0)
+        mesh = ax.pcolormesh(data['xedges'], data['yedges'], counts, cmap='Blues',
+                             norm=LogNorm(vmin=1, vmax=max(counts.max(), 2)))
+        fig.colorbar(mesh, ax=ax, label='Equipment count')
+    elif chart_type == 'envelope':
+        ax.fill_between(data['x'], data['low'], data['high'], color='#60a5fa', alpha=0.4, linewidth=0)
+        ax.plot(data['x'], data['high'], color='#60a5fa', linewidth=1)
+        ax.plot(data['x'], data['low'], color='#60a5fa', linewidth=1)
+    elif chart_type == 'pie':
+        colors = CHART_COLORS[:8]
+        # Create pie chart with better label positioning
+        wedges, texts, autotexts = ax.pie(data['y'], labels=data['x'], autopct='%1.1f%%', 
+                                          startangle=90, colors=colors[:len(data['x'])],
+                                          pctdistance=0.85, labeldistance=1.1,
+                                          textprops={'fontsize': 11, 'fontweight': 'bold'})
+        
+        # Improve label positioning to avoid overlap
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(10)
+        
+        # Add legend instead of labels for better readability
+        ax.legend(wedges, [f'{label} ({count})' for label, count in zip(data['x'], data['y'])],
+                  title="Equipment Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1),
+                  fontsize=10)
+        
+        # Remove labels from pie chart to reduce congestion
+        for text in texts:
+            text.set_text('')
+    
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    if chart_type != 'pie':
+        ax.set_xlabel(xlabel, fontsize=14, fontweight='600')
+        ax.set_ylabel(ylabel, fontsize=14, fontweight='600')
+    
+    ax.grid(True, alpha=0.3, linestyle='--')
+    fig.tight_layout(pad=2.0)  # Increased padding
+    
+    # Save to BytesIO; the figure is garbage once it goes out of scope
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format='png', dpi=dpi, bbox_inches='tight', facecolor='white')
+    img_buffer.seek(0)
+    
+    return img_buffer
+
+
+def rotate_xticklabels(ax, rotation=45):
+    for label in ax.get_xticklabels():
+        label.set_rotation(rotation)
+        label.set_horizontalalignment('right')
+
+
+def render_chart(spec, dpi=DEFAULT_CHART_DPI):
+    """Render one ChartSpec to PNG bytes"""
+    return create_chart(*spec, dpi=dpi).getvalue()
+
+
+def get_chart_mode():
+    mode = getattr(settings, 'REPORT_CHART_MODE', DEFAULT_CHART_MODE)
+    if mode not in CHART_MODES:
+        raise ValueError(f'REPORT_CHART_MODE must be one of {", ".join(CHART_MODES)}')
+    return mode
+
+
+def get_chart_dpi():
+    return getattr(settings, 'REPORT_CHART_DPI', DEFAULT_CHART_DPI)
+
+
+def get_chart_workers():
+    workers = getattr(settings, 'REPORT_CHART_WORKERS', None)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_DEFAULT_CHART_WORKERS)
+    return workers
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # Spawned rather than forked: the web process may be threaded
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def render_charts(specs, dpi=None):
+    """Render ChartSpecs to a list of PNG bytes in the same order"""
+    specs = list(specs)
+    render = partial(render_chart, dpi=dpi or get_chart_dpi())
+    workers = min(get_chart_workers(), len(specs))
+    if workers <= 1:
+        return [render(spec) for spec in specs]
+    executor = _get_executor(get_chart_workers())
+    try:
+        return list(executor.map(render, specs))
+    except BrokenProcessPool:
+        # A worker died; drop the pool and finish this report in-process
+        _discard_executor(executor)
+        return [render(spec) for spec in specs]
+
+
+def density_grid(x, y, bins=DENSITY_BINS):
+    """2D histogram of (x, y): counts of shape bins plus the bin edges"""
+    counts, xedges, yedges = np.histogram2d(np.asarray(x, dtype=np.float64),
+                                            np.asarray(y, dtype=np.float64), bins=bins)
+    return {'counts': counts, 'xedges': xedges, 'yedges': yedges}
+
+
+def minmax_envelope(values, buckets=ENVELOPE_BUCKETS):
+    """Split `values` into `buckets` runs and return each run's centre index, min and max"""
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.linspace(0, len(values), min(buckets, len(values)) + 1).astype(np.int64)[:-1]
+    ends = np.append(starts[1:], len(values))
+    return {
+        'x': (starts + ends - 1) / 2,
+        'low': np.minimum.reduceat(values, starts),
+        'high': np.maximum.reduceat(values, starts),
+    }
+
+
+def aggregate_spec(spec):
+    """Replace large scatter/line data with a density grid or min/max envelope"""
+    data = spec.data
+    if spec.chart_type == 'scatter' and len(data['x']) > LARGE_N_POINTS:
+        return spec._replace(chart_type='density', data=density_grid(data['x'], data['y']))
+    if spec.chart_type == 'line' and len(data['y']) > LARGE_N_POINTS:
+        return spec._replace(chart_type='envelope', data=minmax_envelope(data['y']))
+    return spec
+
+
+def vector_supported(spec):
+    if spec.chart_type == 'scatter':
+        return len(spec.data['x']) <= MAX_VECTOR_POINTS
+    return spec.chart_type in ('bar', 'pie', 'density', 'envelope')
+
+
+def chart_flowables(charts, mode=None, dpi=None):
+    """Turn (spec, width, height) triples into ReportLab flowables in the same order"""
+    mode = mode or get_chart_mode()
+    charts = [(aggregate_spec(spec), width, height) for spec, width, height in charts]
+    flowables = [None] * len(charts)
+    raster = []
+    for i, (spec, width, height) in enumerate(charts):
+        if mode == 'vector' and vector_supported(spec):
+            flowables[i] = create_drawing(spec, width, height)
+        else:
+            raster.append(i)
+    images = render_charts([charts[i][0] for i in raster], dpi)
+    for i, png in zip(raster, images):
+        _, width, height = charts[i]
+        flowables[i] = Image(BytesIO(png), width=width, height=height)
+    return flowables
+
+
+def _axis_titles(drawing, plot, xlabel, ylabel):
+    drawing.add(String(plot.x + plot.width / 2, 10, xlabel, fontName='Helvetica-Bold',
+                       fontSize=10, textAnchor='middle'))
+    label = Group(String(0, 0, ylabel, fontName='Helvetica-Bold', fontSize=10, textAnchor='middle'))
+    label.translate(14, plot.y + plot.height / 2)
+    label.rotate(90)
+    drawing.add(label)
+
+
+def _grid(axis):
+    axis.visibleGrid = 1
+    axis.gridStrokeColor = pdf_colors.HexColor('#d1d5db')
+    axis.gridStrokeDashArray = (2, 2)
+
+
+def create_drawing(spec, width, height):
+    """Draw a ChartSpec as a ReportLab Drawing, embedded in the PDF as vector paths"""
+    data = spec.data
+    palette = [pdf_colors.HexColor(c) for c in CHART_COLORS]
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 18, spec.title, fontName='Helvetica-Bold',
+                       fontSize=14, textAnchor='middle'))
+
+    if spec.chart_type == 'pie':
+        values = [float(v) for v in data['y']]
+        total = sum(values) or 1.0
+        pie = Pie()
+        pie.width = pie.height = min(height - 70, width / 2)
+        pie.x = 40
+        pie.y = (height - 30 - pie.height) / 2
+        pie.data = values
+        pie.startAngle = 90
+        pie.direction = 'anticlockwise'
+        pie.labels = [f'{v / total * 100:.1f}%' for v in values]
+        pie.simpleLabels = 1
+        pie.slices.labelRadius = 0.75
+        pie.slices.fontName = 'Helvetica-Bold'
+        pie.slices.fontSize = 9
+        pie.slices.fontColor = pdf_colors.white
+        pie.slices.strokeColor = pdf_colors.white
+        for i in range(len(values)):
+            pie.slices[i].fillColor = palette[i % 8]
+        drawing.add(pie)
+
+        legend = Legend()
+        legend.x = pie.x + pie.width + 40
+        legend.y = pie.y + pie.height / 2
+        legend.boxAnchor = 'w'
+        legend.alignment = 'right'
+        legend.fontName = 'Helvetica'
+        legend.fontSize = 10
+        legend.colorNamePairs = [(palette[i % 8], f'{label} ({count})')
+                                 for i, (label, count) in enumerate(zip(data['x'], data['y']))]
+        drawing.add(String(legend.x, legend.y + 8 + 7 * len(values), 'Equipment Types',
+                           fontName='Helvetica-Bold', fontSize=10))
+        drawing.add(legend)
+        return drawing
+
+    if spec.chart_type in ('density', 'envelope'):
+        _draw_aggregate(drawing, spec, width, height)
+        return drawing
+
+    if spec.chart_type == 'bar':
+        values = [float(v) for v in data['y']]
+        plot = VerticalBarChart()
+        plot.x, plot.y, plot.width, plot.height = 60, 90, width - 80, height - 130
+        plot.data = [values]
+        plot.categoryAxis.categoryNames = [str(x) for x in data['x']]
+        plot.categoryAxis.labels.angle = 45
+        plot.categoryAxis.labels.boxAnchor = 'ne'
+        plot.categoryAxis.labels.fontSize = 8
+        if min(values, default=0) >= 0:
+            plot.valueAxis.valueMin = 0
+        _grid(plot.valueAxis)
+        plot.barLabelFormat = '%.1f'
+        plot.barLabels.nudge = 7
+        plot.barLabels.fontName = 'Helvetica-Bold'
+        plot.barLabels.fontSize = 8
+        plot.bars.strokeColor = None
+        for i in range(len(values)):
+            plot.bars[(0, i)].fillColor = palette[i % len(palette)]
+    else:
+        plot = LinePlot()
+        plot.x, plot.y, plot.width, plot.height = 60, 50, width - 80, height - 90
+        x = np.asarray(data['x'], dtype=np.float64).tolist()
+        y = np.asarray(data['y'], dtype=np.float64).tolist()
+        plot.data = [list(zip(x, y))]
+        plot.joinedLines = 0
+        marker = makeMarker('Circle')
+        marker.size = 5
+        marker.fillColor = pdf_colors.HexColor(CHART_COLORS[0])
+        marker.strokeColor = pdf_colors.white
+        marker.strokeWidth = 0.5
+        plot.lines[0].symbol = marker
+        _grid(plot.xValueAxis)
+        _grid(plot.yValueAxis)
+
+    drawing.add(plot)
+    _axis_titles(drawing, plot, spec.xlabel, spec.ylabel)
+    return drawing
+
+
+def _draw_aggregate(drawing, spec, width, height):
+    """Draw a density grid or min/max envelope on bare value axes"""
+    data = spec.data
+    plot = Box(60, 50, width - 80, height - 90)
+    if spec.chart_type == 'density':
+        xrange = (float(data['xedges'][0]), float(data['xedges'][-1]))
+        yrange = (float(data['yedges'][0]), float(data['yedges'][-1]))
+    else:
+        xrange = (float(data['x'][0]), float(data['x'][-1]))
+        yrange = (float(data['low'].min()), float(data['high'].max()))
+
+    x_axis = XValueAxis()
+    x_axis.setPosition(plot.x, plot.y, plot.width)
+    x_axis.configure([xrange])
+    y_axis = YValueAxis()
+    y_axis.setPosition(plot.x, plot.y, plot.height)
+    y_axis.configure([yrange])
+    x_axis.joinAxis = y_axis
+    x_axis.joinAxisMode = 'bottom'
+    y_axis.joinAxis = x_axis
+    y_axis.joinAxisMode = 'left'
+
+    if spec.chart_type == 'density':
+        counts = data['counts']
+        xs = [x_axis.scale(v) for v in data['xedges']]
+        ys = [y_axis.scale(v) for v in data['yedges']]
+        # Shade non-empty cells from light to dark blue on a log scale
+        light = np.array([0xdb, 0xea, 0xfe]) / 255
+        dark = np.array([0x1e, 0x40, 0xaf]) / 255
+        scale = np.log1p(counts) / np.log1p(max(counts.max(), 1))
+        for i, j in zip(*np.nonzero(counts)):
+            r, g, b = light + (dark - light) * scale[i, j]
+            drawing.add(Rect(xs[i], ys[j], xs[i + 1] - xs[i], ys[j + 1] - ys[j],
+                             fillColor=pdf_colors.Color(r, g, b), strokeColor=None))
+        drawing.add(String(width - 20, height - 34, f'Darker cells hold more equipment (max {int(counts.max())})',
+                           fontName='Helvetica', fontSize=8, textAnchor='end'))
+    else:
+        xs = [x_axis.scale(v) for v in data['x']]
+        upper = [p for x, y in zip(xs, data['high']) for p in (x, y_axis.scale(y))]
+        lower = [p for x, y in zip(xs[::-1], data['low'][::-1]) for p in (x, y_axis.scale(y))]
+        drawing.add(Polygon(upper + lower, fillColor=pdf_colors.HexColor(CHART_COLORS[0]),
+                            fillOpacity=0.5, strokeColor=pdf_colors.HexColor(CHART_COLORS[0]), strokeWidth=0.5))
+
+    drawing.add(x_axis)
+    drawing.add(y_axis)
+    _axis_titles(drawing, plot, spec.xlabel, spec.ylabel)
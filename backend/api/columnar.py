@@ -0,0 +1,196 @@
+"""Per-dataset columnar copies of the equipment readings.
+
+Each dataset gets a directory under COLUMN_STORE_ROOT holding one raw
+little-endian file per column plus a small JSON header:
+
+    flowrate.f8, pressure.f8, temperature.f8   float64 values in row order
+    type.i4                                    int32 codes into meta['types']
+    meta.json                                  {"version", "rows", "types"}
+
+Files are memory-mapped on read, so analytics work on zero-copy arrays
+instead of hydrating Equipment instances. The ORM rows remain the source of
+truth for row-level access; a missing store is rebuilt from them on demand.
+"""
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+FORMAT_VERSION = 1
+NUMERIC_COLUMNS = ('flowrate', 'pressure', 'temperature')
+FLOAT_DTYPE = np.dtype('<f8')
+CODE_DTYPE = np.dtype('<i4')
+META_FILE = 'meta.json'
+
+
+def store_root():
+    return getattr(settings, 'COLUMN_STORE_ROOT', None) or os.path.join(settings.MEDIA_ROOT, 'columns')
+
+
+def store_path(dataset_id):
+    return os.path.join(store_root(), str(dataset_id))
+
+
+def _column_file(path, column, dtype):
+    return os.path.join(path, f'{column}.{dtype.kind}{dtype.itemsize}')
+
+
+class Columns(namedtuple('Columns', ['flowrate', 'pressure', 'temperature', 'type_codes', 'type_names'])):
+    """Column arrays for one dataset; `type_names[type_codes[i]]` is row i's type"""
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.type_codes)
+
+    @property
+    def types(self):
+        """Decoded type column as a NumPy string array"""
+        return np.asarray(self.type_names, dtype=str)[self.type_codes]
+
+
+class ColumnWriter:
+    """Append rows to a dataset's column files.
+
+    Types are dictionary-encoded as they arrive. With `append=True` the
+    existing files and dictionary are extended instead of replaced.
+    """
+
+    def __init__(self, dataset_id, append=False):
+        self.path = store_path(dataset_id)
+        meta = read_meta(dataset_id) if append else None
+        if meta is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            meta = {'version': FORMAT_VERSION, 'rows': 0, 'types': []}
+        os.makedirs(self.path, exist_ok=True)
+        self.initial_rows = meta['rows']
+        self.rows = meta['rows']
+        self.type_names = list(meta['types'])
+        self._codes = {name: code for code, name in enumerate(self.type_names)}
+        self._files = {}
+        for column, dtype in self._layout():
+            f = open(_column_file(self.path, column, dtype), 'ab')
+            # Drop anything past the last committed row (e.g. an aborted append)
+            f.truncate(self.rows * dtype.itemsize)
+            self._files[column] = f
+
+    @staticmethod
+    def _layout():
+        return [(column, FLOAT_DTYPE) for column in NUMERIC_COLUMNS] + [('type', CODE_DTYPE)]
+
+    def encode_types(self, types):
+        codes = np.empty(len(types), dtype=CODE_DTYPE)
+        for i, name in enumerate(types):
+            code = self._codes.get(name)
+            if code is None:
+                code = self._codes[name] = len(self.type_names)
+                self.type_names.append(name)
+            codes[i] = code
+        return codes
+
+    def append(self, types, flowrate, pressure, temperature):
+        """Write one batch and return its type codes"""
+        codes = self.encode_types(types)
+        values = {
+            'flowrate': flowrate,
+            'pressure': pressure,
+            'temperature': temperature,
+            'type': codes,
+        }
+        for column, dtype in self._layout():
+            np.asarray(values[column], dtype=dtype).tofile(self._files[column])
+        self.rows += len(types)
+        return codes
+
+    def close(self):
+        """Flush the column files and publish the new row count"""
+        for f in self._files.values():
+            f.close()
+        meta = {'version': FORMAT_VERSION, 'rows': self.rows, 'types': self.type_names}
+        tmp_path = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def abort(self):
+        """Discard rows written since the writer was opened"""
+        for f in self._files.values():
+            f.close()
+        if self.initial_rows == 0:
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            for column, dtype in self._layout():
+                with open(_column_file(self.path, column, dtype), 'ab') as f:
+                    f.truncate(self.initial_rows * dtype.itemsize)
+
+
+def read_meta(dataset_id):
+    try:
+        with open(os.path.join(store_path(dataset_id), META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == FORMAT_VERSION else None
+
+
+def _map(path, dtype, rows):
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+
+def load_columns(dataset_id):
+    """Memory-map a dataset's columns, or return None if no store exists"""
+    meta = read_meta(dataset_id)
+    if meta is None:
+        return None
+    path = store_path(dataset_id)
+    rows = meta['rows']
+    try:
+        arrays = {column: _map(_column_file(path, column, FLOAT_DTYPE), FLOAT_DTYPE, rows)
+                  for column in NUMERIC_COLUMNS}
+        codes = _map(_column_file(path, 'type', CODE_DTYPE), CODE_DTYPE, rows)
+    except (OSError, ValueError):
+        return None
+    return Columns(arrays['flowrate'], arrays['pressure'], arrays['temperature'], codes, meta['types'])
+
+
+def build_columns(dataset):
+    """Write the column store for `dataset` from its Equipment rows"""
+    writer = ColumnWriter(dataset.pk)
+    try:
+        rows = dataset.equipment.order_by('id').values_list('type', 'flowrate', 'pressure', 'temperature')
+        batch = []
+        for row in rows.iterator(chunk_size=10000):
+            batch.append(row)
+            if len(batch) >= 10000:
+                _append_rows(writer, batch)
+                batch = []
+        _append_rows(writer, batch)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return load_columns(dataset.pk)
+
+
+def _append_rows(writer, rows):
+    if not rows:
+        return
+    types, flowrate, pressure, temperature = zip(*rows)
+    writer.append(types, flowrate, pressure, temperature)
+
+
+def get_columns(dataset):
+    """Return the dataset's columns, building the store first if it is missing"""
+    columns = load_columns(dataset.pk)
+    if columns is None:
+        columns = build_columns(dataset)
+    return columns
+
+
+def delete_columns(dataset_id):
+    shutil.rmtree(store_path(dataset_id), ignore_errors=True)
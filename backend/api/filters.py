@@ -0,0 +1,66 @@
+"""Row filters for /api/equipment/<id>/.
+
+    ?type=Pump                   type equality
+    ?type=Pump,Valve             type IN (...)
+    ?temperature_min=100         numeric ranges, inclusive, on flowrate,
+    ?pressure_max=12.5           pressure and temperature
+
+The same filter is applied as a WHERE clause (served by the per-dataset
+indexes on Equipment) and as a NumPy mask over the column store, so every
+response format returns the same rows.
+"""
+import math
+
+import numpy as np
+
+from .stats import PARAMETERS
+
+
+class EquipmentFilter:
+    def __init__(self, types=None, ranges=None):
+        self.types = types or []
+        self.ranges = ranges or {}
+
+    @classmethod
+    def from_params(cls, params):
+        types = [t.strip() for t in params.get('type', '').split(',') if t.strip()]
+        ranges = {}
+        for field in PARAMETERS:
+            for bound in ('min', 'max'):
+                value = params.get(f'{field}_{bound}')
+                if value in (None, ''):
+                    continue
+                try:
+                    number = float(value)
+                except ValueError:
+                    number = math.nan
+                if math.isnan(number):
+                    raise ValueError(f'{field}_{bound} must be a number')
+                ranges[(field, bound)] = number
+        return cls(types, ranges)
+
+    def __bool__(self):
+        return bool(self.types or self.ranges)
+
+    def apply(self, queryset):
+        if len(self.types) == 1:
+            queryset = queryset.filter(type=self.types[0])
+        elif self.types:
+            # The redundant range lets SQLite search the (dataset, type) index;
+            # for an IN list alone it walks every row of the dataset in id
+            # order instead, to avoid sorting the matches
+            queryset = queryset.filter(type__in=self.types, type__gte=min(self.types), type__lte=max(self.types))
+        lookups = {'min': 'gte', 'max': 'lte'}
+        return queryset.filter(**{f'{field}__{lookups[bound]}': value
+                                  for (field, bound), value in self.ranges.items()})
+
+    def mask(self, columns):
+        """Boolean array selecting the matching rows of an api.columnar.Columns"""
+        keep = np.ones(len(columns), dtype=bool)
+        if self.types:
+            codes = [code for code, name in enumerate(columns.type_names) if name in self.types]
+            keep &= np.isin(columns.type_codes, codes)
+        for (field, bound), value in self.ranges.items():
+            values = getattr(columns, field)
+            keep &= (values >= value) if bound == 'min' else (values <= value)
+        return keep
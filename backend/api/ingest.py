@@ -0,0 +1,516 @@
+import bz2
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import lzma
+import multiprocessing
+import os
+import zlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from .columnar import ColumnWriter, get_columns
+from .jobs import init_django_worker
+from .models import Equipment
+from .summary import SummaryAccumulator, get_or_compute_summary
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+DEFAULT_PARALLEL_CHUNK_BYTES = 16 * 1024 * 1024
+DECOMPRESS_READ_SIZE = 256 * 1024
+
+try:
+    import zstandard
+except ImportError:  # optional: .csv.zst uploads are accepted only when installed
+    zstandard = None
+
+# Compressed uploads are decompressed as they are parsed; each opener wraps a
+# binary file object in one that reads decompressed bytes. Every format
+# accepts concatenated members/streams, as produced by e.g. `pigz` or `cat`.
+DECOMPRESSORS = {
+    '.gz': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    '.bz2': bz2.BZ2File,
+    '.xz': lzma.LZMAFile,
+}
+if zstandard is not None:
+    DECOMPRESSORS['.zst'] = lambda raw: zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class IngestError(ValueError):
+    """Raised when a CSV row cannot be turned into an Equipment record"""
+
+    def __init__(self, message, line=None):
+        if line is not None:
+            message = f'Row {line}: {message}'
+        super().__init__(message)
+        self.line = line
+
+
+def get_batch_size(batch_size=None):
+    """Resolve the bulk_create batch size from the argument or settings"""
+    if batch_size is None:
+        batch_size = getattr(settings, 'CSV_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    batch_size = int(batch_size)
+    if batch_size < 1:
+        raise ValueError('Batch size must be a positive integer')
+    return batch_size
+
+
+def missing_columns(fieldnames):
+    """Return the required columns absent from a CSV header"""
+    fieldnames = fieldnames or []
+    return [col for col in REQUIRED_COLUMNS if col not in fieldnames]
+
+
+def parse_row(row, line=None):
+    """Validate one DictReader row and return (name, type, flowrate, pressure, temperature)"""
+    try:
+        name = row['Equipment Name']
+        eq_type = row['Type']
+        flowrate = float(row['Flowrate'])
+        pressure = float(row['Pressure'])
+        temperature = float(row['Temperature'])
+    except KeyError as e:
+        raise IngestError(f'missing column {e}', line)
+    except (TypeError, ValueError) as e:
+        raise IngestError(str(e), line)
+
+    if name is None or eq_type is None:
+        raise IngestError('row has fewer columns than the header', line)
+
+    return name, eq_type, flowrate, pressure, temperature
+
+
+class ContentHasher:
+    """SHA-256 fingerprint of a dataset's rows that does not depend on batching.
+
+    Each field is hashed as its own stream (names and types NUL-terminated,
+    numbers as little-endian float64), so feeding the same rows in any
+    batch sizes gives the same digest. The field digests are combined, after
+    the dataset's previous hash if any, by hexdigest().
+    """
+
+    def __init__(self):
+        self._streams = [hashlib.sha256() for _ in range(5)]
+
+    def update(self, names, types, flowrate, pressure, temperature):
+        names_stream, types_stream, *number_streams = self._streams
+        names_stream.update(''.join(name + '\0' for name in names).encode('utf-8'))
+        types_stream.update(''.join(eq_type + '\0' for eq_type in types).encode('utf-8'))
+        for stream, values in zip(number_streams, (flowrate, pressure, temperature)):
+            stream.update(np.ascontiguousarray(values, dtype='<f8').tobytes())
+
+    def hexdigest(self, previous=''):
+        combined = hashlib.sha256(previous.encode('ascii'))
+        for stream in self._streams:
+            combined.update(stream.digest())
+        return combined.hexdigest()
+
+
+def get_content_hash(dataset, batch_size=None):
+    """Return the dataset's content hash, computing it from its rows if it predates the field"""
+    if dataset.content_hash:
+        return dataset.content_hash
+    batch_size = get_batch_size(batch_size)
+    hasher = ContentHasher()
+    rows = dataset.equipment.order_by('id').values_list('name', 'type', 'flowrate', 'pressure', 'temperature')
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            hasher.update(*zip(*batch))
+            batch = []
+    if batch:
+        hasher.update(*zip(*batch))
+    dataset.content_hash = hasher.hexdigest()
+    dataset.save(update_fields=['content_hash'])
+    return dataset.content_hash
+
+
+class EquipmentIngestor:
+    """Buffer parsed rows and write them with bulk_create in fixed-size batches.
+
+    Each batch is also appended to the dataset's column store and folded into
+    its DatasetSummary and content hash, which are saved by finish(). The caller is
+    responsible for wrapping the whole ingest in a transaction so a failure
+    part-way through leaves nothing behind, and for calling abort() then.
+
+    With `append=True` the rows are added to a dataset that already has some:
+    the column store is extended, the stored summary is merged with the new
+    rows and the content hash is chained onto the previous one, so the work
+    is proportional to the new rows only.
+    """
+
+    def __init__(self, dataset, batch_size=None, append=False):
+        self.dataset = dataset
+        self.batch_size = get_batch_size(batch_size)
+        self.append = append
+        self.rows = 0
+        if append:
+            # Datasets from before the column store / summaries get them built once
+            get_columns(dataset)
+            self.summary = SummaryAccumulator.from_summary(get_or_compute_summary(dataset))
+            self.previous_hash = get_content_hash(dataset, batch_size)
+        else:
+            self.summary = SummaryAccumulator()
+            self.previous_hash = ''
+        self.columns = ColumnWriter(dataset.pk, append=append)
+        self.hasher = ContentHasher()
+        self._buffer = []
+        self._started = time.perf_counter()
+
+    def add(self, name, eq_type, flowrate, pressure, temperature):
+        self._buffer.append(Equipment(
+            dataset=self.dataset,
+            name=name,
+            type=eq_type,
+            flowrate=flowrate,
+            pressure=pressure,
+            temperature=temperature
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def add_columns(self, names, types, flowrates, pressures, temperatures):
+        """Add a block of already-converted rows given as parallel columns.
+
+        The NumPy columns go to the column store, summary and hash as they
+        are; model instances are only built for bulk_create.
+        """
+        self.flush()
+        for start in range(0, len(names), self.batch_size):
+            batch = slice(start, start + self.batch_size)
+            flowrate, pressure, temperature = flowrates[batch], pressures[batch], temperatures[batch]
+            equipment = [
+                Equipment(dataset=self.dataset, name=name, type=eq_type, flowrate=f, pressure=p, temperature=t)
+                for name, eq_type, f, p, t in zip(names[batch], types[batch], flowrate.tolist(),
+                                                  pressure.tolist(), temperature.tolist())
+            ]
+            self._write(equipment, names[batch], types[batch], flowrate, pressure, temperature)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        equipment, self._buffer = self._buffer, []
+        self._write(
+            equipment,
+            [e.name for e in equipment],
+            [e.type for e in equipment],
+            np.array([e.flowrate for e in equipment], dtype=np.float64),
+            np.array([e.pressure for e in equipment], dtype=np.float64),
+            np.array([e.temperature for e in equipment], dtype=np.float64),
+        )
+
+    def _write(self, equipment, names, types, flowrate, pressure, temperature):
+        Equipment.objects.bulk_create(equipment, batch_size=self.batch_size)
+        codes = self.columns.append(types, flowrate, pressure, temperature)
+        self.summary.update(codes, self.columns.type_names, flowrate, pressure, temperature)
+        self.hasher.update(names, types, flowrate, pressure, temperature)
+        self.rows += len(equipment)
+
+    def finish(self):
+        """Flush remaining rows and return ingest statistics"""
+        self.flush()
+        self.columns.close()
+        self.summary.save(self.dataset)
+        self.dataset.content_hash = self.hasher.hexdigest(previous=self.previous_hash)
+        update_fields = ['content_hash']
+        if self.append:
+            # No longer the contents of a single uploaded file
+            self.dataset.source_hash = ''
+            update_fields.append('source_hash')
+        self.dataset.save(update_fields=update_fields)
+        elapsed = time.perf_counter() - self._started
+        return {
+            'rows': self.rows,
+            'total_rows': self.summary.count,
+            'elapsed_seconds': round(elapsed, 4),
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def abort(self):
+        self._buffer = []
+        self.columns.abort()
+
+
+def ingest_csv(dataset, csv_reader, batch_size=None, append=False):
+    """Parse every row of a csv.DictReader into `dataset` using batched inserts"""
+    ingestor = EquipmentIngestor(dataset, batch_size, append)
+    try:
+        for row in csv_reader:
+            ingestor.add(*parse_row(row, csv_reader.line_num))
+        return ingestor.finish()
+    except BaseException:
+        ingestor.abort()
+        raise
+
+
+def iter_text_lines(chunks, encoding='utf-8-sig'):
+    """Incrementally decode byte chunks and yield text lines with their endings.
+
+    Only the current chunk and one partial line are held in memory, so the
+    cost does not grow with the size of the upload.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        while True:
+            end = pending.find('\n', start)
+            if end < 0:
+                break
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def compression_suffix(filename):
+    """The compression extension of an accepted upload name ('' for plain .csv), or None"""
+    if filename.endswith('.csv'):
+        return ''
+    for suffix in DECOMPRESSORS:
+        if filename.endswith('.csv' + suffix):
+            return suffix
+    return None
+
+
+def accepted_extensions():
+    return ['.csv'] + ['.csv' + suffix for suffix in DECOMPRESSORS]
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only binary file object over an iterator of byte chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b''
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def decompressed_chunks(chunks, suffix):
+    """Yield the decompressed bytes of a compressed chunk stream, a bounded block at a time"""
+    try:
+        with DECOMPRESSORS[suffix](io.BufferedReader(ChunkStream(chunks))) as f:
+            while True:
+                data = f.read(DECOMPRESS_READ_SIZE)
+                if not data:
+                    break
+                yield data
+    except DECOMPRESSION_ERRORS as e:
+        raise IngestError(f'Could not decompress {suffix} upload: {e}')
+
+
+def upload_chunks(uploaded_file):
+    """The upload's CSV bytes chunk by chunk, decompressing .csv.gz and friends on the fly"""
+    suffix = compression_suffix(uploaded_file.name)
+    if suffix:
+        return decompressed_chunks(uploaded_file.chunks(), suffix)
+    return uploaded_file.chunks()
+
+
+def stream_csv(uploaded_file):
+    """Return a DictReader that reads `uploaded_file` chunk by chunk"""
+    return csv.DictReader(iter_text_lines(upload_chunks(uploaded_file)))
+
+
+def get_parallel_workers():
+    workers = getattr(settings, 'CSV_PARALLEL_WORKERS', None)
+    return int(workers) if workers else (os.cpu_count() or 1)
+
+
+def parallel_source_path(uploaded_file):
+    """Return the on-disk path of an upload large enough for parallel parsing, else None"""
+    if get_parallel_workers() < 2 or not hasattr(uploaded_file, 'temporary_file_path'):
+        return None
+    # Byte ranges of a compressed file can't be parsed independently
+    if compression_suffix(uploaded_file.name):
+        return None
+    min_bytes = getattr(settings, 'CSV_PARALLEL_MIN_BYTES', DEFAULT_PARALLEL_MIN_BYTES)
+    if uploaded_file.size < min_bytes:
+        return None
+    path = uploaded_file.temporary_file_path()
+    # Byte ranges split records whose quoted fields span lines
+    if has_multiline_records(path):
+        return None
+    return path
+
+
+def has_multiline_records(path, block_size=1024 * 1024):
+    """True if a quoted field in the file contains a newline.
+
+    Tracks quote parity line by line (an escaped "" doesn't change it), so
+    blocks without any quote character cost a single substring search.
+    """
+    inside = False
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            if not inside and b'"' not in block:
+                continue
+            *lines, tail = block.split(b'\n')
+            for line in lines:
+                inside ^= line.count(b'"') % 2 == 1
+                if inside:
+                    return True
+            inside ^= tail.count(b'"') % 2 == 1
+    return False
+
+
+def split_line_ranges(path, start, chunk_bytes):
+    """Split path[start:] into (begin, end) byte ranges that each end on a newline"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        begin = start
+        while begin < size:
+            end = min(begin + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((begin, end))
+            begin = end
+    return ranges
+
+
+def _parse_range(path, begin, end, indices):
+    """Parse one byte range into NumPy columns. Runs in a worker process.
+
+    Returns a dict of columns, or an `error` entry with the line number
+    relative to the start of the range so the parent can report it.
+    """
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        text = f.read(end - begin).decode('utf-8')
+
+    width = max(indices) + 1
+    name_idx, type_idx, flow_idx, pressure_idx, temp_idx = indices
+    reader = csv.reader(io.StringIO(text))
+    names, types, flowrates, pressures, temperatures = [], [], [], [], []
+    for record in reader:
+        if not record:
+            continue
+        if len(record) < width:
+            return {'error': (reader.line_num, 'row has fewer columns than the header')}
+        names.append(record[name_idx])
+        types.append(record[type_idx])
+        flowrates.append(record[flow_idx])
+        pressures.append(record[pressure_idx])
+        temperatures.append(record[temp_idx])
+
+    try:
+        columns = [np.array(values, dtype=np.float64) for values in (flowrates, pressures, temperatures)]
+    except ValueError:
+        # Locate the offending row only on the failure path
+        reader = csv.reader(io.StringIO(text))
+        for record in reader:
+            if not record:
+                continue
+            for idx in (flow_idx, pressure_idx, temp_idx):
+                try:
+                    float(record[idx])
+                except ValueError as e:
+                    return {'error': (reader.line_num, str(e))}
+        raise
+
+    return {
+        'names': names,
+        'types': types,
+        'flowrates': columns[0],
+        'pressures': columns[1],
+        'temperatures': columns[2],
+        'lines': text.count('\n'),
+    }
+
+
+def ingest_csv_parallel(dataset, path, fieldnames, batch_size=None, workers=None, append=False):
+    """Parse `path` in line-aligned byte ranges across a process pool.
+
+    Ranges are submitted through a bounded window and merged strictly in file
+    order into the batched writer. This path assumes one record per physical
+    line; parallel_source_path() sends files with quoted multi-line fields to
+    the streaming path instead.
+    """
+    workers = workers or get_parallel_workers()
+    chunk_bytes = getattr(settings, 'CSV_PARALLEL_CHUNK_BYTES', DEFAULT_PARALLEL_CHUNK_BYTES)
+    indices = tuple(fieldnames.index(col) for col in REQUIRED_COLUMNS)
+
+    with open(path, 'rb') as f:
+        f.readline()
+        data_start = f.tell()
+    ranges = split_line_ranges(path, data_start, chunk_bytes)
+
+    ingestor = EquipmentIngestor(dataset, batch_size, append)
+    try:
+        stats = _merge_parsed_ranges(ingestor, path, ranges, indices, workers)
+    except BaseException:
+        ingestor.abort()
+        raise
+    stats['workers'] = workers
+    return stats
+
+
+def _merge_parsed_ranges(ingestor, path, ranges, indices, workers):
+    lines_before = 1  # the header line
+    # Spawned, not forked: ingest runs on gthread workers and background
+    # threads, where forking a multi-threaded process is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_django_worker) as pool:
+        pending = deque()
+        remaining = iter(ranges)
+
+        def submit_next():
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(pool.submit(_parse_range, path, *next_range, indices))
+
+        # Keep a bounded number of ranges in flight so parsed columns never
+        # pile up faster than the writer can insert them
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            result = pending.popleft().result()
+            if 'error' in result:
+                for future in pending:
+                    future.cancel()
+                offset, message = result['error']
+                raise IngestError(message, lines_before + offset)
+            submit_next()
+            ingestor.add_columns(result['names'], result['types'], result['flowrates'],
+                                 result['pressures'], result['temperatures'])
+            lines_before += result['lines']
+
+    return ingestor.finish()
+
+
+def ingest_upload(dataset, uploaded_file, csv_reader, batch_size=None, append=False):
+    """Ingest an upload, using the process pool for large on-disk files"""
+    path = parallel_source_path(uploaded_file)
+    if path:
+        return ingest_csv_parallel(dataset, path, csv_reader.fieldnames, batch_size, append=append)
+    return ingest_csv(dataset, csv_reader, batch_size, append)
@@ -0,0 +1,140 @@
+"""Background PDF report jobs.
+
+POST /api/reports/ records a ReportJob and hands its id to a bounded pool of
+local worker processes, so the request returns as soon as the job is saved.
+Clients poll /api/reports/<id>/ and fetch the PDF from
+/api/reports/<id>/download/ once the job is done. Reports are rendered into
+the shared report cache (api/reportcache.py). Workers are spawned (not
+forked) so they never share the web process's database connections; each one
+sets Django up once and then renders reports back to back.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_WORKERS = 2
+DEFAULT_REPORT_JOB_TIMEOUT = 600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_report_workers():
+    return getattr(settings, 'REPORT_WORKERS', DEFAULT_REPORT_WORKERS)
+
+
+def get_job_timeout():
+    return getattr(settings, 'REPORT_JOB_TIMEOUT', DEFAULT_REPORT_JOB_TIMEOUT)
+
+
+def fail_stale_jobs(jobs):
+    """Mark FAILED the jobs in `jobs` still pending or running after REPORT_JOB_TIMEOUT.
+
+    The pool only lives in memory, so a job queued or running when the web
+    process restarted (or its worker was recycled) is never picked up again;
+    without this every later request for the dataset would join it forever.
+    """
+    from .models import ReportJob
+
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    stale = jobs.filter(Q(status=ReportJob.PENDING, created_at__lt=cutoff) |
+                        Q(status=ReportJob.RUNNING, started_at__lt=cutoff))
+    failed = stale.update(status=ReportJob.FAILED, error='Report job was lost or timed out',
+                          finished_at=timezone.now())
+    if failed:
+        logger.warning('Marked %d stale report jobs as failed', failed)
+    return failed
+
+
+def init_django_worker():
+    """ProcessPoolExecutor initializer for spawned workers that use the ORM.
+
+    Lives here because this module imports no models, so the initializer can
+    be unpickled before Django is set up.
+    """
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=get_report_workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_django_worker,
+            )
+        return _executor
+
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def run_report_job(job_id):
+    """Render one job's PDF; runs in a pool worker (or inline when REPORT_WORKERS is 0)"""
+    from .models import ReportJob
+    from .reportcache import cached_report, render_report, report_key
+
+    # Claim the job; it may have been deleted along with its dataset meanwhile
+    claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.PENDING).update(
+        status=ReportJob.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return
+    job = ReportJob.objects.select_related('dataset').get(pk=job_id)
+
+    try:
+        key = report_key(job.dataset)
+        path = cached_report(key) or render_report(job.dataset, key)
+    except Exception as e:
+        logger.exception('Report job %s failed', job_id)
+        ReportJob.objects.filter(pk=job_id).update(
+            status=ReportJob.FAILED, error=str(e), finished_at=timezone.now())
+        return
+
+    ReportJob.objects.filter(pk=job_id).update(
+        status=ReportJob.DONE, file_path=path, finished_at=timezone.now())
+
+
+def _job_finished(job_id, future):
+    # Exceptions inside run_report_job are recorded on the job; this only
+    # sees the worker process dying or the pool failing to start
+    error = future.exception()
+    if error is None:
+        return
+    from .models import ReportJob
+
+    logger.error('Report worker failed on job %s: %s', job_id, error)
+    ReportJob.objects.filter(pk=job_id, status__in=ReportJob.ACTIVE_STATUSES).update(
+        status=ReportJob.FAILED, error=f'Report worker failed: {error}', finished_at=timezone.now())
+
+
+def submit_report_job(job_id):
+    """Queue `job_id` for rendering; call once the job row is committed"""
+    if get_report_workers() <= 0:
+        run_report_job(job_id)
+        return
+
+    executor = get_executor()
+    try:
+        future = executor.submit(run_report_job, job_id)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool
+        _discard_executor(executor)
+        future = get_executor().submit(run_report_job, job_id)
+    future.add_done_callback(partial(_job_finished, job_id))
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'HeatExchanger', 'Condenser']
+
+
+def write_sample_csv(path, size_mb):
+    """Write a synthetic equipment CSV of roughly `size_mb` megabytes"""
+    target = size_mb * 1024 * 1024
+    rng = random.Random(42)
+    written = 0
+    row = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        header = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+        f.write(header)
+        written += len(header)
+        while written < target:
+            lines = []
+            for _ in range(10000):
+                row += 1
+                lines.append(f'Unit-{row},{rng.choice(TYPES)},{rng.uniform(50, 300):.2f},'
+                             f'{rng.uniform(1, 20):.2f},{rng.uniform(20, 400):.2f}\n')
+            block = ''.join(lines)
+            f.write(block)
+            written += len(block)
+    return row
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def _measure_streaming_ingest(path, batch_size, queue):
+    """Run the streaming parser in a fresh process and report its peak RSS"""
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.files import File
+    from api.ingest import EquipmentIngestor, parse_row, stream_csv
+    from api.models import Dataset
+
+    class DryRunIngestor(EquipmentIngestor):
+        # Parse and batch exactly like a real upload but drop each batch
+        # instead of writing it, so only the parsing pipeline is measured
+        def flush(self):
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    # Keep the (empty) column store of the unsaved dataset out of MEDIA_ROOT
+    settings.COLUMN_STORE_ROOT = os.path.dirname(path)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        reader = stream_csv(File(f))
+        ingestor = DryRunIngestor(Dataset(name='bench'), batch_size)
+        for row in reader:
+            ingestor.add(*parse_row(row, reader.line_num))
+        ingestor.flush()
+    queue.put({
+        'rows': ingestor.rows,
+        'seconds': time.perf_counter() - started,
+        'baseline_mb': baseline,
+        'peak_mb': peak_rss_mb(),
+    })
+
+
+class Command(BaseCommand):
+    help = 'Measure peak RSS and throughput of the streaming CSV ingest path across file sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100],
+                            help='Input sizes in megabytes (e.g. --sizes 10 100 1000 2000)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context('spawn')
+        self.stdout.write(f"{'size':>8} {'rows':>12} {'rows/sec':>12} {'baseline RSS':>14} {'peak RSS':>10}")
+        with tempfile.TemporaryDirectory() as tmp:
+            for size_mb in options['sizes']:
+                path = os.path.join(tmp, f'bench_{size_mb}mb.csv')
+                write_sample_csv(path, size_mb)
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure_streaming_ingest,
+                                   args=(path, options['batch_size'], queue))
+                proc.start()
+                result = queue.get()
+                proc.join()
+                os.remove(path)
+                self.stdout.write(
+                    f"{size_mb:>6}MB {result['rows']:>12} "
+                    f"{result['rows'] / result['seconds']:>12.0f} "
+                    f"{result['baseline_mb']:>12.1f}MB {result['peak_mb']:>8.1f}MB"
+                )
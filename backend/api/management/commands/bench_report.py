@@ -0,0 +1,48 @@
+import tempfile
+import time
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from api.ingest import EquipmentIngestor
+from api.models import Dataset
+from api.reports import build_report
+
+from .bench_stats import make_rows
+
+
+class Command(BaseCommand):
+    help = 'Compare PDF report size and render time with vector and raster charts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--dpi', nargs='+', type=int, default=[150, 300])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        modes = [('vector', None)] + [('raster', dpi) for dpi in options['dpi']]
+        with tempfile.TemporaryDirectory() as tmp, override_settings(COLUMN_STORE_ROOT=tmp), transaction.atomic():
+            user = User.objects.create_user('bench-report')
+            dataset = Dataset.objects.create(name='bench', uploaded_by=user, file_path='')
+            ingestor = EquipmentIngestor(dataset)
+            for row in make_rows(options['rows']):
+                ingestor.add(*row)
+            ingestor.finish()
+
+            self.stdout.write(f"{'mode':>12} {'size':>12} {'render':>12}")
+            for mode, dpi in modes:
+                with override_settings(REPORT_CHART_MODE=mode, REPORT_CHART_DPI=dpi or 300):
+                    best = float('inf')
+                    for _ in range(options['repeat']):
+                        output = BytesIO()
+                        started = time.perf_counter()
+                        build_report(dataset, output)
+                        best = min(best, time.perf_counter() - started)
+                label = f'{mode}@{dpi}' if dpi else mode
+                self.stdout.write(f"{label:>12} {len(output.getvalue()) / 1024:>9.1f} KB {best * 1000:>10.1f}ms")
+
+            # Leave nothing behind in the database
+            transaction.set_rollback(True)
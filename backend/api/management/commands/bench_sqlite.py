@@ -0,0 +1,133 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE dataset (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name TEXT NOT NULL);
+CREATE TABLE equipment (
+    id INTEGER PRIMARY KEY, dataset_id INTEGER NOT NULL, name TEXT NOT NULL, type TEXT NOT NULL,
+    flowrate REAL NOT NULL, pressure REAL NOT NULL, temperature REAL NOT NULL
+);
+CREATE INDEX equipment_dataset ON equipment (dataset_id);
+CREATE TABLE summary (dataset_id INTEGER PRIMARY KEY, count INTEGER NOT NULL, flowrate_mean REAL);
+"""
+
+
+def profiles():
+    """(pragmas, BEGIN statement, connect timeout) as Django opens connections under each profile"""
+    return {
+        # django.db.backends.sqlite3 defaults: rollback journal, deferred BEGIN
+        'default': ({}, 'BEGIN', 5.0),
+        'production': (dict(settings.SQLITE_PRAGMAS), 'BEGIN IMMEDIATE', 5.0),
+    }
+
+
+def connect(path, pragmas, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, profile, deadline, action):
+        super().__init__(daemon=True)
+        self.path, self.profile, self.deadline, self.action = path, profile, deadline, action
+        self.ops = 0
+        self.errors = 0
+        self.latencies = []
+
+    def run(self):
+        pragmas, begin, timeout = self.profile
+        conn = connect(self.path, pragmas, timeout)
+        rng = random.Random(self.ident)
+        while time.perf_counter() < self.deadline:
+            started = time.perf_counter()
+            try:
+                self.action(conn, begin, rng)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                self.errors += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                continue
+            self.ops += 1
+            self.latencies.append(time.perf_counter() - started)
+        conn.close()
+
+
+def make_upload(rows):
+    def upload(conn, begin, rng):
+        # Mirrors upload_csv: retention check, new dataset, batched inserts, summary
+        user_id = rng.randrange(4)
+        conn.execute(begin)
+        conn.execute('SELECT count(*) FROM dataset WHERE user_id = ?', (user_id,)).fetchone()
+        dataset_id = conn.execute('INSERT INTO dataset (user_id, name) VALUES (?, ?)',
+                                  (user_id, 'bench.csv')).lastrowid
+        conn.executemany(
+            'INSERT INTO equipment (dataset_id, name, type, flowrate, pressure, temperature) VALUES (?, ?, ?, ?, ?, ?)',
+            [(dataset_id, f'Unit-{i}', 'Pump', rng.uniform(50, 300), rng.uniform(1, 20), rng.uniform(20, 400))
+             for i in range(rows)])
+        conn.execute('INSERT INTO summary (dataset_id, count, flowrate_mean) VALUES (?, ?, ?)',
+                     (dataset_id, rows, 100.0))
+        conn.execute('COMMIT')
+    return upload
+
+
+def read_summary(conn, begin, rng):
+    conn.execute('SELECT * FROM summary WHERE dataset_id = ?', (rng.randrange(1, 50),)).fetchall()
+    conn.execute('SELECT id, name FROM dataset WHERE user_id = ? ORDER BY id DESC LIMIT 50',
+                 (rng.randrange(4),)).fetchall()
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent uploads and summary reads against SQLite with the default and production profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--rows', type=int, default=5000, help='rows per simulated upload')
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':>12} {'uploads/s':>10} {'reads/s':>10} {'upload p95':>11} "
+                          f"{'read p95':>10} {'lock errors':>12}")
+        for name, profile in profiles().items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                pragmas, _, timeout = profile
+                setup = connect(path, pragmas, timeout)
+                setup.executescript(SCHEMA)
+                setup.close()
+
+                deadline = time.perf_counter() + options['seconds']
+                writers = [Worker(path, profile, deadline, make_upload(options['rows']))
+                           for _ in range(options['writers'])]
+                readers = [Worker(path, profile, deadline, read_summary) for _ in range(options['readers'])]
+                for worker in writers + readers:
+                    worker.start()
+                for worker in writers + readers:
+                    worker.join()
+
+            seconds = options['seconds']
+            uploads = sum(w.ops for w in writers)
+            reads = sum(r.ops for r in readers)
+            errors = sum(w.errors for w in writers + readers)
+            upload_p95 = percentile([t for w in writers for t in w.latencies], 0.95)
+            read_p95 = percentile([t for r in readers for t in r.latencies], 0.95)
+            self.stdout.write(f"{name:>12} {uploads / seconds:>10.1f} {reads / seconds:>10.1f} "
+                              f"{upload_p95 * 1000:>9.1f}ms {read_p95 * 1000:>8.1f}ms {errors:>12}")
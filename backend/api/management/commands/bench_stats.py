@@ -0,0 +1,88 @@
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.columnar import Columns
+from api.stats import columns_stats
+
+Row = namedtuple('Row', ['name', 'type', 'flowrate', 'pressure', 'temperature'])
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'HeatExchanger', 'Condenser']
+
+
+def legacy_stats(equipment):
+    """The statistics generate_pdf_report and get_summary used to compute, loop for loop"""
+    flowrates = [e.flowrate for e in equipment]
+    pressures = [e.pressure for e in equipment]
+    temperatures = [e.temperature for e in equipment]
+
+    avg_flow = sum(flowrates) / len(flowrates)
+    avg_pressure = sum(pressures) / len(pressures)
+    avg_temp = sum(temperatures) / len(temperatures)
+
+    type_counts = {}
+    for e in equipment:
+        type_counts[e.type] = type_counts.get(e.type, 0) + 1
+
+    type_avg_data = {}
+    for eq_type in type_counts.keys():
+        type_equipment = [e for e in equipment if e.type == eq_type]
+        type_avg_data[eq_type] = {
+            'flowrate': sum(e.flowrate for e in type_equipment) / len(type_equipment),
+            'pressure': sum(e.pressure for e in type_equipment) / len(type_equipment),
+            'temperature': sum(e.temperature for e in type_equipment) / len(type_equipment)
+        }
+
+    pressure_std = np.std(pressures)
+    temp_std = np.std(temperatures)
+    ranges = (min(flowrates), max(flowrates), min(pressures), max(pressures),
+              min(temperatures), max(temperatures))
+    high_temp = [e for e in equipment if e.temperature > avg_temp + temp_std]
+    high_pressure = [e for e in equipment if e.pressure > avg_pressure + pressure_std]
+    return avg_flow, type_avg_data, ranges, len(high_temp), len(high_pressure)
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    return [Row(f'Unit-{i}', rng.choice(TYPES), rng.uniform(50, 300),
+                rng.uniform(1, 20), rng.uniform(20, 400)) for i in range(n)]
+
+
+def to_columns(rows):
+    names = {t: i for i, t in enumerate(TYPES)}
+    return Columns(
+        np.array([r.flowrate for r in rows]),
+        np.array([r.pressure for r in rows]),
+        np.array([r.temperature for r in rows]),
+        np.array([names[r.type] for r in rows], dtype=np.int32),
+        TYPES,
+    )
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Compare the vectorized stats engine with the previous pure-Python statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>10} {'legacy':>12} {'vectorized':>12} {'speedup':>10}")
+        for n in options['sizes']:
+            rows = make_rows(n)
+            columns = to_columns(rows)
+            legacy = best_of(options['repeat'], legacy_stats, rows)
+            vectorized = best_of(options['repeat'], columns_stats, columns)
+            self.stdout.write(f"{n:>10} {legacy * 1000:>10.1f}ms {vectorized * 1000:>10.1f}ms "
+                              f"{legacy / vectorized:>9.1f}x")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.retention import expired_dataset_ids, get_retention_policy, purge_datasets
+from api.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete datasets past the retention limits (DATASET_RETENTION_* settings) and stale upload sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only sweep this user id (default: everyone)')
+        parser.add_argument('--dry-run', action='store_true', help='List the datasets without deleting them')
+
+    def handle(self, *args, **options):
+        policy = get_retention_policy()
+        self.stdout.write(f'Policy: {policy.max_per_user or "unlimited"} datasets per user, '
+                          f'{policy.max_age_days or "unlimited"} days, {policy.max_rows or "unlimited"} rows')
+        ids = expired_dataset_ids(options['user'])
+        if options['dry_run']:
+            self.stdout.write(f'Would purge {len(ids)} datasets: {ids}')
+            return
+        purged = purge_datasets(ids)
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} datasets'))
+        expired = expire_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Removed {expired} stale upload sessions'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api.columnar import get_columns
+from api.models import Dataset
+from api.summary import compute_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored DatasetSummary for existing datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_ids', nargs='*', type=int,
+                            help='Datasets to recompute (default: all)')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Only compute summaries for datasets that have none')
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.all()
+        if options['dataset_ids']:
+            datasets = datasets.filter(id__in=options['dataset_ids'])
+        if options['missing_only']:
+            datasets = datasets.filter(summary__isnull=True)
+
+        done = 0
+        for dataset in datasets.iterator():
+            summary = compute_summary(dataset, get_columns(dataset))
+            self.stdout.write(f'Dataset {dataset.id} ({dataset.name}): {summary.count} rows')
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {done} dataset summaries'))
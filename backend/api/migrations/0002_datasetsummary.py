@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetSummary',
+            fields=[
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='api.dataset')),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('flowrate_mean', models.FloatField(null=True)),
+                ('flowrate_std', models.FloatField(null=True)),
+                ('flowrate_min', models.FloatField(null=True)),
+                ('flowrate_max', models.FloatField(null=True)),
+                ('pressure_mean', models.FloatField(null=True)),
+                ('pressure_std', models.FloatField(null=True)),
+                ('pressure_min', models.FloatField(null=True)),
+                ('pressure_max', models.FloatField(null=True)),
+                ('temperature_mean', models.FloatField(null=True)),
+                ('temperature_std', models.FloatField(null=True)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('type_distribution', models.JSONField(default=dict)),
+                ('type_averages', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
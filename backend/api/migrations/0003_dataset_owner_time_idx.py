@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_datasetsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['uploaded_by', 'uploaded_at'], name='api_dataset_owner_time_idx'),
+        ),
+    ]
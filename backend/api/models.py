@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -6,9 +8,20 @@ class Dataset(models.Model):
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     file_path = models.CharField(max_length=500)
+    # SHA-256 of the rows (see api.ingest.ContentHasher); keys the report cache
+    content_hash = models.CharField(max_length=64, blank=True)
+    # SHA-256 of the uploaded file's bytes; an identical re-upload by the same
+    # user returns this dataset instead of ingesting it again
+    source_hash = models.CharField(max_length=64, blank=True)
     
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Backs the per-user catalog's keyset pagination on (uploaded_at, id)
+            models.Index(fields=['uploaded_by', 'uploaded_at'], name='api_dataset_owner_time_idx'),
+            # Duplicate-upload lookup
+            models.Index(fields=['uploaded_by', 'source_hash'], name='api_dataset_owner_src_idx'),
+        ]
 
 class Equipment(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='equipment')
@@ -18,5 +31,93 @@ class Equipment(models.Model):
     pressure = models.FloatField()
     temperature = models.FloatField()
     
+    class Meta:
+        indexes = [
+            # Serves per-type GROUP BY and type filters within one dataset
+            models.Index(fields=['dataset', 'type'], name='api_equip_dataset_type_idx'),
+            # Range filters on each parameter within one dataset
+            models.Index(fields=['dataset', 'flowrate'], name='api_equip_dataset_flow_idx'),
+            models.Index(fields=['dataset', 'pressure'], name='api_equip_dataset_press_idx'),
+            models.Index(fields=['dataset', 'temperature'], name='api_equip_dataset_temp_idx'),
+        ]
+    
     def __str__(self):
-        return f"{self.name} ({self.type})"
\ No newline at end of file
+        return f"{self.name} ({self.type})"
+
+class DatasetSummary(models.Model):
+    """Aggregates for one dataset, computed in the same pass as ingest"""
+    dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    count = models.PositiveBigIntegerField(default=0)
+    flowrate_mean = models.FloatField(null=True)
+    flowrate_std = models.FloatField(null=True)
+    flowrate_min = models.FloatField(null=True)
+    flowrate_max = models.FloatField(null=True)
+    pressure_mean = models.FloatField(null=True)
+    pressure_std = models.FloatField(null=True)
+    pressure_min = models.FloatField(null=True)
+    pressure_max = models.FloatField(null=True)
+    temperature_mean = models.FloatField(null=True)
+    temperature_std = models.FloatField(null=True)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    type_distribution = models.JSONField(default=dict)
+    type_averages = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+class ReportJob(models.Model):
+    """A PDF report rendered in the background by api.jobs"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='report_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+class UploadSession(models.Model):
+    """A resumable upload sent as numbered chunks (see api.uploads)"""
+    OPEN = 'open'
+    INGESTING = 'ingesting'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (OPEN, 'Open'),
+        (INGESTING, 'Ingesting'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    total_chunks = models.PositiveIntegerField(null=True)
+    # Set once ingest finishes; a duplicate upload points at the existing dataset
+    dataset = models.ForeignKey(Dataset, on_delete=models.SET_NULL, null=True, related_name='+')
+    rows = models.PositiveBigIntegerField(null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last chunk received or status change; sessions idle past
+    # UPLOAD_SESSION_MAX_AGE_HOURS are expired (see api.uploads.expire_sessions)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_at']
@@ -0,0 +1,117 @@
+"""Content-addressed on-disk cache of rendered PDF reports.
+
+A report is fully determined by the dataset's rows, its name (printed in the
+title), the report template and the chart settings, so the cache key is a
+hash of the dataset's content_hash, name, REPORT_TEMPLATE_VERSION and the
+chart mode and DPI. The key doubles as the response ETag. Entries are
+evicted least-recently-used first (hits refresh the file's mtime) once the
+directory exceeds REPORT_CACHE_MAX_BYTES.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+from .charts import get_chart_dpi, get_chart_mode
+from .ingest import get_content_hash
+from .reports import REPORT_TEMPLATE_VERSION, build_report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_root():
+    return getattr(settings, 'REPORT_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'report_cache'))
+
+
+def get_cache_max_bytes():
+    return getattr(settings, 'REPORT_CACHE_MAX_BYTES', DEFAULT_REPORT_CACHE_MAX_BYTES)
+
+
+def report_key(dataset):
+    digest = hashlib.sha256()
+    digest.update(f'v{REPORT_TEMPLATE_VERSION}:{get_chart_mode()}:{get_chart_dpi()}\0'.encode())
+    digest.update(get_content_hash(dataset).encode() + b'\0')
+    digest.update(dataset.name.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(cache_root(), f'{key}.pdf')
+
+
+def cached_report(key):
+    """Path of the cached report for `key`, marking it recently used, or None"""
+    path = cache_path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def render_report(dataset, key):
+    """Render `dataset` into the cache under `key` and return the path"""
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Concurrent renders of the same key each write their own file; the last rename wins
+    partial_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        build_report(dataset, partial_path)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    evict(keep=path)
+    return path
+
+
+def open_report(dataset, key=None):
+    """Return (file, key) for the dataset's report, rendering it on a cache miss"""
+    key = key or report_key(dataset)
+    path = cached_report(key)
+    if path is not None:
+        try:
+            return open(path, 'rb'), key
+        except FileNotFoundError:
+            pass  # evicted in between
+    return open(render_report(dataset, key), 'rb'), key
+
+
+def evict(max_bytes=None, keep=None):
+    """Delete least-recently-used reports until the cache fits in `max_bytes`"""
+    max_bytes = get_cache_max_bytes() if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    try:
+        with os.scandir(cache_root()) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info('Evicted %d cached reports', removed)
+    return removed
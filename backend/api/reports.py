@@ -0,0 +1,289 @@
+"""PDF report rendering.
+
+build_report() is shared by the synchronous /api/report/<id>/ endpoint and
+the background report jobs in api/jobs.py, so both produce the same document.
+Every section reads from one ReportContext, so rendering a report costs a
+fixed number of queries however large the dataset is.
+"""
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.lib.units import inch
+
+from .charts import ChartSpec, chart_flowables
+from .columnar import get_columns
+from .stats import columns_stats
+
+# Part of every report cache key: bump whenever build_report's output changes
+REPORT_TEMPLATE_VERSION = 4
+# Rows listed by name: the first 8 in the flowrate chart, 15 in the detail table
+CHART_ROWS = 8
+TABLE_ROWS = 15
+
+
+class ReportContext:
+    """Everything build_report reads about a dataset.
+
+    Numeric columns come from the memory-mapped column store and the
+    statistics from one vectorized pass over them. The only query is for the
+    first TABLE_ROWS rows, which the report shows by name.
+    """
+
+    def __init__(self, dataset, columns, head):
+        self.dataset = dataset
+        self.columns = columns
+        self.head = head
+        self.stats = columns_stats(columns)
+
+    @classmethod
+    def build(cls, dataset):
+        head = list(dataset.equipment.order_by('id').values_list(
+            'name', 'type', 'flowrate', 'pressure', 'temperature', named=True)[:TABLE_ROWS])
+        return cls(dataset, get_columns(dataset), head)
+
+    @property
+    def total_count(self):
+        return self.stats['count']
+
+
+def build_report(dataset, output, context=None):
+    """Render the analysis report for `dataset` as a PDF into `output` (a path or binary file object)"""
+    context = context or ReportContext.build(dataset)
+    columns = context.columns
+    stats = context.stats
+    total_count = context.total_count
+    
+    # Create PDF document with better margins
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    # Charts are collected as specs with a placeholder in the story and
+    # rendered together once the layout is known
+    charts = []
+    
+    def add_chart(spec, width, height):
+        charts.append((len(story), spec, width, height))
+        story.append(None)
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=20,
+        textColor=colors.HexColor('#1e293b'),
+        alignment=1  # Center alignment
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=15,
+        spaceBefore=20,
+        textColor=colors.HexColor('#374151'),
+        borderWidth=1,
+        borderColor=colors.HexColor('#e5e7eb'),
+        borderPadding=10,
+        backColor=colors.HexColor('#f8fafc')
+    )
+    
+    # Title
+    story.append(Paragraph(f"Equipment Analysis Report: {dataset.name}", title_style))
+    story.append(Spacer(1, 12))
+    
+    if total_count:
+        pressures = columns.pressure
+        temperatures = columns.temperature
+        
+        avg_flow = stats['flowrate']['mean']
+        avg_pressure = stats['pressure']['mean']
+        avg_temp = stats['temperature']['mean']
+        
+        # Equipment type distribution
+        type_counts = stats['type_distribution']
+        
+        # Executive Summary
+        story.append(Paragraph("Executive Summary", heading_style))
+        summary_data = [
+            ['Metric', 'Value'],
+            ['Total Equipment', str(total_count)],
+            ['Average Flowrate', f"{avg_flow:.2f} L/min"],
+            ['Average Pressure', f"{avg_pressure:.2f} bar"],
+            ['Average Temperature', f"{avg_temp:.2f} °C"],
+            ['Equipment Types', str(len(type_counts))]
+        ]
+        
+        summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
+        summary_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0'))
+        ]))
+        story.append(summary_table)
+        story.append(Spacer(1, 20))
+        
+        # Equipment Type Distribution Chart
+        story.append(Paragraph("Equipment Type Distribution", heading_style))
+        type_chart_data = {
+            'x': list(type_counts.keys()),
+            'y': list(type_counts.values())
+        }
+        add_chart(ChartSpec(type_chart_data, 'pie', 'Equipment Distribution by Type', '', '', 'type_dist'), 7*inch, 5*inch)
+        story.append(PageBreak())  # Start new page for parameter analysis
+        
+        # Parameter Analysis Charts
+        story.append(Paragraph("Parameter Analysis", heading_style))
+        
+        # Flowrate by Equipment Type
+        # Create shorter, more readable equipment names
+        equipment_list = context.head[:CHART_ROWS]  # Reduced to 8 items for better readability
+        equipment_names = []
+        seen_types = {}
+        for e in equipment_list:
+            name = e.name
+            seen_types[e.type] = seen_types.get(e.type, 0) + 1
+            # If name is too long, use equipment type + index
+            if len(name) > 12:
+                equipment_names.append(f"{e.type}-{seen_types[e.type]}")
+            else:
+                equipment_names.append(name)
+        
+        flowrate_chart_data = {
+            'x': equipment_names,
+            'y': [e.flowrate for e in equipment_list]
+        }
+        add_chart(ChartSpec(flowrate_chart_data, 'bar', 'Flowrate by Equipment (Top 8)', 'Equipment', 'Flowrate (L/min)', 'flowrate'), 7*inch, 5*inch)
+        story.append(Spacer(1, 25))
+        
+        # Pressure vs Temperature Scatter Plot
+        scatter_data = {
+            'x': pressures,
+            'y': temperatures
+        }
+        add_chart(ChartSpec(scatter_data, 'scatter', 'Pressure vs Temperature Correlation', 'Pressure (bar)', 'Temperature (°C)', 'scatter'), 7*inch, 5*inch)
+        story.append(Spacer(1, 25))
+        
+        # Add Parameter Comparison Chart
+        story.append(Paragraph("Parameter Comparison by Equipment Type", heading_style))
+        
+        # Group data by equipment type for comparison
+        type_avg_data = stats['type_averages']
+        
+        # Create comparison bar chart for average flowrates by type
+        if type_avg_data:
+            comparison_data = {
+                'x': list(type_avg_data.keys()),
+                'y': [data['flowrate'] for data in type_avg_data.values()]
+            }
+            add_chart(ChartSpec(comparison_data, 'bar', 'Average Flowrate by Equipment Type', 'Equipment Type', 'Average Flowrate (L/min)', 'comparison'), 7*inch, 4*inch)
+            story.append(PageBreak())  # Start new page for detailed data
+        
+        # Detailed Equipment Data Table
+        story.append(Paragraph("Detailed Equipment Data", heading_style))
+        table_data = [['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
+        
+        for e in context.head:  # Show first 15 items
+            table_data.append([
+                e.name[:20] + '...' if len(e.name) > 20 else e.name,
+                e.type,
+                f"{e.flowrate:.1f}",
+                f"{e.pressure:.1f}",
+                f"{e.temperature:.1f}"
+            ])
+        
+        if total_count > TABLE_ROWS:
+            table_data.append(['...', '...', '...', '...', '...'])
+            table_data.append([f"Total: {total_count} items", '', '', '', ''])
+        
+        equipment_table = Table(table_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
+        equipment_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+            ('FONTSIZE', (0, 1), (-1, -1), 9)
+        ]))
+        story.append(equipment_table)
+        story.append(Spacer(1, 20))
+        
+        # Statistical Analysis
+        story.append(Paragraph("Statistical Analysis", heading_style))
+        
+        pressure_std = stats['pressure']['std']
+        temp_std = stats['temperature']['std']
+        
+        stats_data = [['Parameter', 'Mean', 'Std Dev', 'Min', 'Median', 'Max']]
+        for label, param in [('Flowrate (L/min)', 'flowrate'), ('Pressure (bar)', 'pressure'), ('Temperature (°C)', 'temperature')]:
+            param_stats = stats[param]
+            stats_data.append([
+                label,
+                f"{param_stats['mean']:.2f}",
+                f"{param_stats['std']:.2f}",
+                f"{param_stats['min']:.2f}",
+                f"{param_stats['percentiles']['p50']:.2f}",
+                f"{param_stats['max']:.2f}"
+            ])
+        
+        stats_table = Table(stats_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch, 1*inch])
+        stats_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+            ('FONTSIZE', (0, 1), (-1, -1), 9)
+        ]))
+        story.append(stats_table)
+        story.append(Spacer(1, 20))
+        
+        # Recommendations
+        story.append(Paragraph("Recommendations & Insights", heading_style))
+        recommendations = []
+        
+        # High temperature equipment
+        high_temp_count = stats['temperature']['high_count']
+        if high_temp_count:
+            recommendations.append(f"• {high_temp_count} equipment items are operating at high temperatures (>{avg_temp + temp_std:.1f}°C). Consider reviewing cooling systems.")
+        
+        # High pressure equipment
+        high_pressure_count = stats['pressure']['high_count']
+        if high_pressure_count:
+            recommendations.append(f"• {high_pressure_count} equipment items are operating at high pressures (>{avg_pressure + pressure_std:.1f} bar). Monitor for safety compliance.")
+        
+        # Equipment type recommendations
+        most_common_type = max(type_counts, key=type_counts.get)
+        recommendations.append(f"• {most_common_type} equipment represents {type_counts[most_common_type]/total_count*100:.1f}% of your fleet. Consider standardization benefits.")
+        
+        recommendations.append("• Regular maintenance scheduling recommended based on operating parameters.")
+        recommendations.append("• Consider implementing real-time monitoring for critical equipment.")
+        
+        for rec in recommendations:
+            story.append(Paragraph(rec, styles['Normal']))
+            story.append(Spacer(1, 6))
+        
+    else:
+        story.append(Paragraph("No equipment data available for this dataset.", styles['Normal']))
+    
+    # Draw every chart at once: vector Drawings, or rasters rendered in
+    # parallel when REPORT_CHART_WORKERS allows
+    flowables = chart_flowables([(spec, width, height) for _, spec, width, height in charts])
+    for (index, _, _, _), flowable in zip(charts, flowables):
+        story[index] = flowable
+    
+    # Build PDF
+    doc.build(story)
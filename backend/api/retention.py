@@ -0,0 +1,128 @@
+"""Per-user dataset retention.
+
+The policy comes from settings; 0 disables a limit:
+
+    DATASET_RETENTION_MAX_PER_USER   keep only the user's newest N datasets
+    DATASET_RETENTION_MAX_AGE_DAYS   drop datasets uploaded longer ago than this
+    DATASET_RETENTION_MAX_ROWS       drop the user's oldest datasets once their
+                                     total rows exceed this (the newest one
+                                     always stays)
+
+Uploads don't delete anything themselves: once an upload commits it queues a
+sweep of that user's datasets on a single background thread. The sweep finds
+expired datasets with window-function queries over the catalog and deletes
+them in batches of set-based DELETEs, so an upload never waits on the rows of
+the dataset it pushes out. `manage.py purge_datasets` runs the same sweep for
+every user.
+"""
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BigIntegerField, F, RowRange, Sum, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .models import Dataset
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 50
+
+RetentionPolicy = namedtuple('RetentionPolicy', 'max_per_user max_age_days max_rows')
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_retention_policy():
+    return RetentionPolicy(
+        max_per_user=getattr(settings, 'DATASET_RETENTION_MAX_PER_USER', 5),
+        max_age_days=getattr(settings, 'DATASET_RETENTION_MAX_AGE_DAYS', 0),
+        max_rows=getattr(settings, 'DATASET_RETENTION_MAX_ROWS', 0),
+    )
+
+
+def expired_dataset_ids(user_id=None, policy=None, now=None):
+    """Ids of the datasets (of one user, or everyone's) the policy no longer keeps"""
+    policy = policy or get_retention_policy()
+    datasets = Dataset.objects.all() if user_id is None else Dataset.objects.filter(uploaded_by_id=user_id)
+    expired = set()
+
+    if policy.max_age_days:
+        cutoff = (now or timezone.now()) - timedelta(days=policy.max_age_days)
+        expired.update(datasets.filter(uploaded_at__lt=cutoff).values_list('id', flat=True))
+
+    if policy.max_per_user or policy.max_rows:
+        newest_first = [F('uploaded_at').desc(), F('id').desc()]
+        ranked = datasets.order_by().annotate(
+            position=Window(RowNumber(), partition_by=[F('uploaded_by')], order_by=newest_first),
+            # Rows in this dataset and every newer one of the same user
+            rows_through=Window(
+                Sum(Coalesce('summary__count', 0, output_field=BigIntegerField())),
+                partition_by=[F('uploaded_by')], order_by=newest_first, frame=RowRange(start=None, end=0)),
+        )
+        if policy.max_per_user:
+            expired.update(ranked.filter(position__gt=policy.max_per_user).values_list('id', flat=True))
+        if policy.max_rows:
+            expired.update(ranked.filter(position__gt=1, rows_through__gt=policy.max_rows)
+                           .values_list('id', flat=True))
+    return sorted(expired)
+
+
+def purge_datasets(dataset_ids, batch_size=PURGE_BATCH_SIZE):
+    """Delete the datasets and everything hanging off them; returns how many went"""
+    purged = 0
+    for start in range(0, len(dataset_ids), batch_size):
+        batch = dataset_ids[start:start + batch_size]
+        # Nothing listens for Equipment, DatasetSummary or ReportJob deletes,
+        # so the collector removes them with one DELETE ... WHERE dataset_id IN
+        # per table; only the Dataset rows themselves are loaded (for the
+        # column-store cleanup signal). One transaction per batch keeps the
+        # write lock short.
+        with transaction.atomic():
+            _, deleted = Dataset.objects.filter(id__in=batch).delete()
+        purged += deleted.get(Dataset._meta.label, 0)
+    return purged
+
+
+def sweep(user_id=None):
+    """Apply the retention policy to one user's datasets, or everyone's"""
+    purged = purge_datasets(expired_dataset_ids(user_id))
+    if purged:
+        logger.info('Retention purged %d datasets%s', purged, '' if user_id is None else f' of user {user_id}')
+    return purged
+
+
+def _run_sweep(user_id):
+    with _lock:
+        _pending.discard(user_id)
+    try:
+        sweep(user_id)
+    except Exception:
+        logger.exception('Retention sweep for user %s failed', user_id)
+    finally:
+        # This thread's connections would otherwise stay open until it exits
+        connections.close_all()
+
+
+def schedule_sweep(user_id):
+    """Queue a sweep of `user_id`'s datasets; call once the upload is committed"""
+    global _executor
+    if not getattr(settings, 'DATASET_RETENTION_ASYNC', True):
+        sweep(user_id)
+        return
+    with _lock:
+        # A sweep still waiting to run will see this upload too
+        if user_id in _pending:
+            return
+        _pending.add(user_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retention')
+        executor = _executor
+    executor.submit(_run_sweep, user_id)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Dataset, Equipment
+from .models import Dataset, Equipment, ReportJob, UploadSession
 
 class EquipmentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,4 +14,23 @@ class DatasetSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'uploaded_at', 'equipment_count']
     
     def get_equipment_count(self, obj):
-        return obj.equipment.count()
\ No newline at end of file
+        # Catalog querysets annotate the count; only fall back to COUNT(*) without it
+        count = getattr(obj, 'equipment_count', None)
+        return count if count is not None else obj.equipment.count()
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    dataset_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = ['job_id', 'dataset_id', 'status', 'error', 'created_at', 'started_at', 'finished_at']
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    dataset_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['upload_id', 'filename', 'status', 'total_chunks', 'dataset_id', 'rows', 'error',
+                  'created_at', 'finished_at']
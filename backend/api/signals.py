@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .columnar import delete_columns
+from .models import Dataset, UploadSession
+from .uploads import delete_session_files
+
+
+@receiver(post_delete, sender=Dataset)
+def remove_dataset_columns(sender, instance, **kwargs):
+    # Only drop the files once the delete is committed
+    dataset_id = instance.pk
+    transaction.on_commit(lambda: delete_columns(dataset_id))
+
+
+
+@receiver(post_delete, sender=UploadSession)
+def remove_upload_chunks(sender, instance, **kwargs):
+    session_id = instance.pk
+    transaction.on_commit(lambda: delete_session_files(session_id))
@@ -0,0 +1,90 @@
+"""Vectorized statistics over equipment columns.
+
+Every analytic path (summary, PDF report, ingest-time aggregation) goes
+through these helpers so the numbers agree everywhere. Parameters are stacked
+into one (3, n) float64 matrix so each statistic is a single NumPy reduction
+along axis 1 instead of one Python pass per parameter.
+"""
+import numpy as np
+
+PARAMETERS = ('flowrate', 'pressure', 'temperature')
+DEFAULT_PERCENTILES = (25, 50, 75, 90, 95)
+
+
+def column_matrix(flowrate, pressure, temperature):
+    """Stack the three parameter columns into a (3, n) float64 matrix"""
+    return np.vstack([
+        np.asarray(flowrate, dtype=np.float64),
+        np.asarray(pressure, dtype=np.float64),
+        np.asarray(temperature, dtype=np.float64),
+    ])
+
+
+def describe(matrix):
+    """Count, mean, M2 (sum of squared deviations), min and max of each row of `matrix`"""
+    mean = matrix.mean(axis=1)
+    deviations = matrix - mean[:, None]
+    return {
+        'count': matrix.shape[1],
+        'mean': mean,
+        'm2': np.einsum('ij,ij->i', deviations, deviations),
+        'min': matrix.min(axis=1),
+        'max': matrix.max(axis=1),
+    }
+
+
+def group_by(codes, n_groups, matrix):
+    """Per-group row counts and per-parameter sums, shape (n_groups,) and (3, n_groups)"""
+    codes = np.asarray(codes)
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.vstack([np.bincount(codes, weights=row, minlength=n_groups) for row in matrix])
+    return counts, sums
+
+
+def compute_stats(flowrate, pressure, temperature, type_codes, type_names,
+                  percentiles=DEFAULT_PERCENTILES):
+    """Everything the summary, report and desktop charts need, in one vectorized pass.
+
+    Returns a dict with `count`, per-parameter `mean/std/min/max`,
+    `percentiles` and `high_count` (rows above mean + one std, used by the
+    report recommendations), plus `type_distribution` and `type_averages`
+    keyed by type name in first-appearance order.
+    """
+    matrix = column_matrix(flowrate, pressure, temperature)
+    count = matrix.shape[1]
+    result = {'count': count, 'type_distribution': {}, 'type_averages': {}}
+    if not count:
+        for param in PARAMETERS:
+            result[param] = {'mean': None, 'std': None, 'min': None, 'max': None,
+                             'percentiles': {}, 'high_count': 0}
+        return result
+
+    basic = describe(matrix)
+    std = np.sqrt(basic['m2'] / count)
+    pct = np.percentile(matrix, percentiles, axis=1) if percentiles else np.empty((0, 3))
+    high = np.count_nonzero(matrix > (basic['mean'] + std)[:, None], axis=1)
+
+    for i, param in enumerate(PARAMETERS):
+        result[param] = {
+            'mean': float(basic['mean'][i]),
+            'std': float(std[i]),
+            'min': float(basic['min'][i]),
+            'max': float(basic['max'][i]),
+            'percentiles': {f'p{p}': float(pct[j][i]) for j, p in enumerate(percentiles)},
+            'high_count': int(high[i]),
+        }
+
+    counts, sums = group_by(type_codes, len(type_names), matrix)
+    for code in np.flatnonzero(counts).tolist():
+        name = type_names[code]
+        result['type_distribution'][name] = int(counts[code])
+        result['type_averages'][name] = {
+            param: float(sums[i][code] / counts[code]) for i, param in enumerate(PARAMETERS)
+        }
+    return result
+
+
+def columns_stats(columns, percentiles=DEFAULT_PERCENTILES):
+    """compute_stats() over an api.columnar.Columns instance"""
+    return compute_stats(columns.flowrate, columns.pressure, columns.temperature,
+                         columns.type_codes, columns.type_names, percentiles)
@@ -0,0 +1,147 @@
+"""Streaming aggregation of equipment readings into DatasetSummary rows.
+
+Batches are folded into running count/mean/M2/min/max per parameter using
+Chan et al.'s pairwise merge, so a dataset's summary can be built in the same
+pass as ingest without holding all rows in memory.
+"""
+import numpy as np
+
+from .columnar import get_columns
+from .models import DatasetSummary
+from .stats import PARAMETERS, column_matrix, describe, group_by
+
+
+class RunningStats:
+    """Count, mean, sum of squared deviations, min and max of a stream of floats"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = minimum
+        self.max = maximum
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        # Population standard deviation, matching np.std
+        return (self.m2 / self.count) ** 0.5 if self.count else None
+
+
+class SummaryAccumulator:
+    """Fold batches of rows into the fields of a DatasetSummary"""
+
+    def __init__(self):
+        self.stats = {param: RunningStats() for param in PARAMETERS}
+        # type -> [count, flowrate sum, pressure sum, temperature sum]
+        self.by_type = {}
+
+    def update(self, type_codes, type_names, flowrate, pressure, temperature):
+        """Fold in a batch whose types are dictionary-encoded as codes into `type_names`"""
+        if not len(type_codes):
+            return
+        matrix = column_matrix(flowrate, pressure, temperature)
+        batch = describe(matrix)
+        for i, param in enumerate(PARAMETERS):
+            self.stats[param].merge(RunningStats(
+                batch['count'], float(batch['mean'][i]), float(batch['m2'][i]),
+                float(batch['min'][i]), float(batch['max'][i])
+            ))
+
+        counts, sums = group_by(type_codes, len(type_names), matrix)
+        for code in np.flatnonzero(counts).tolist():
+            totals = self.by_type.setdefault(type_names[code], [0, 0.0, 0.0, 0.0])
+            totals[0] += int(counts[code])
+            for j in range(len(PARAMETERS)):
+                totals[j + 1] += float(sums[j][code])
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Resume accumulating from a stored DatasetSummary, e.g. to append rows.
+
+        M2 and the per-type sums are recovered from the stored std and
+        averages, so only the new rows need to be read.
+        """
+        accumulator = cls()
+        for param in PARAMETERS:
+            std = getattr(summary, f'{param}_std')
+            accumulator.stats[param] = RunningStats(
+                summary.count, getattr(summary, f'{param}_mean') or 0.0,
+                std * std * summary.count if std is not None else 0.0,
+                getattr(summary, f'{param}_min'), getattr(summary, f'{param}_max')
+            )
+        for name, count in summary.type_distribution.items():
+            averages = summary.type_averages.get(name, {})
+            accumulator.by_type[name] = [count] + [averages.get(param, 0.0) * count for param in PARAMETERS]
+        return accumulator
+
+    @property
+    def count(self):
+        return self.stats['flowrate'].count
+
+    def apply_to(self, summary):
+        """Copy the accumulated aggregates onto a DatasetSummary instance"""
+        summary.count = self.count
+        for param, stats in self.stats.items():
+            setattr(summary, f'{param}_mean', stats.mean if stats.count else None)
+            setattr(summary, f'{param}_std', stats.std)
+            setattr(summary, f'{param}_min', stats.min)
+            setattr(summary, f'{param}_max', stats.max)
+        summary.type_distribution = {name: totals[0] for name, totals in self.by_type.items()}
+        summary.type_averages = {
+            name: {param: totals[j + 1] / totals[0] for j, param in enumerate(PARAMETERS)}
+            for name, totals in self.by_type.items()
+        }
+        return summary
+
+    def save(self, dataset):
+        summary = self.apply_to(DatasetSummary(dataset=dataset))
+        summary.save()
+        return summary
+
+
+def compute_summary(dataset, columns):
+    """Recompute and store a dataset's summary from its column arrays"""
+    accumulator = SummaryAccumulator()
+    accumulator.update(columns.type_codes, columns.type_names,
+                       columns.flowrate, columns.pressure, columns.temperature)
+    return accumulator.save(dataset)
+
+
+def get_or_compute_summary(dataset):
+    """Return the stored summary, computing it for datasets ingested before summaries existed"""
+    try:
+        return DatasetSummary.objects.get(pk=dataset.pk)
+    except DatasetSummary.DoesNotExist:
+        return compute_summary(dataset, get_columns(dataset))
+
+
+def summary_payload(summary):
+    """API representation of a DatasetSummary"""
+    payload = {
+        'total_count': summary.count,
+        'avg_flowrate': summary.flowrate_mean,
+        'avg_pressure': summary.pressure_mean,
+        'avg_temperature': summary.temperature_mean,
+        'type_distribution': summary.type_distribution,
+        'type_averages': summary.type_averages,
+    }
+    for param in PARAMETERS:
+        payload[param] = {
+            stat: getattr(summary, f'{param}_{stat}') for stat in ('mean', 'std', 'min', 'max')
+        }
+    return payload
@@ -1,3 +1,1064 @@
-from django.test import TestCase
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from unittest import skipUnless
+from unittest.mock import patch
+from rest_framework.test import APIClient
+
+from . import ingest
+from .authentication import issue_token
+from .backends.sqlite3.base import DatabaseWrapper as SqliteWrapper
+from .filters import EquipmentFilter
+from .charts import (LARGE_N_POINTS, MAX_VECTOR_POINTS, ChartSpec, aggregate_spec, chart_flowables,
+                     minmax_envelope, render_chart, render_charts)
+from .reportcache import cache_root, evict
+from .reports import build_report
+from .retention import RetentionPolicy, expired_dataset_ids, purge_datasets
+from .uploads import expire_sessions
+from .columnar import delete_columns, get_columns, load_columns, store_path
+from .ingest import get_content_hash, iter_text_lines
+from .stats import compute_stats
+from .summary import compute_summary
+from .wire import decode_columns
+from .models import Dataset, DatasetSummary, Equipment, ReportJob, UploadSession
+from .pagination import encode_cursor
+from .serializers import EquipmentSerializer
+
+CSV_HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+
+def make_csv(rows=10, bad_line=None):
+    lines = [CSV_HEADER]
+    for i in range(rows):
+        flowrate = 'oops' if i == bad_line else f'{100 + i}.5'
+        lines.append(f'Pump-{i},{"Pump" if i % 2 else "Valve"},{flowrate},{5 + i % 3},{80 + i}\n')
+    return ''.join(lines).encode('utf-8')
+
+
+class UploadTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media.name, COLUMN_STORE_ROOT=os.path.join(media.name, 'columns'),
+                                       REPORT_CACHE_DIR=os.path.join(media.name, 'report_cache'),
+                                       UPLOAD_SESSION_DIR=os.path.join(media.name, 'upload_sessions'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content, name='plant.csv'):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+
+class UploadCsvTests(UploadTestCase):
+    @override_settings(CSV_INGEST_BATCH_SIZE=3)
+    def test_rows_inserted_in_batches(self):
+        response = self.upload(make_csv(10))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rows'], 10)
+        self.assertIn('rows_per_second', response.data)
+        dataset = Dataset.objects.get(id=response.data['dataset_id'])
+        self.assertEqual(dataset.equipment.count(), 10)
+
+    def test_bad_row_rolls_back_dataset(self):
+        response = self.upload(make_csv(10, bad_line=7))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Row 9', response.data['error'])
+        self.assertFalse(Dataset.objects.exists())
+        self.assertFalse(Equipment.objects.exists())
+
+    def test_missing_columns_rejected(self):
+        response = self.upload(b'Name,Type\nA,Pump\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Dataset.objects.exists())
+
+
+class DuplicateUploadTests(UploadTestCase):
+    def test_identical_upload_returns_existing_dataset(self):
+        first = self.upload(make_csv(10))
+        with CaptureQueriesContext(connection) as queries:
+            second = self.upload(make_csv(10), name='plant-again.csv')
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.data['duplicate'])
+        self.assertEqual(second.data['dataset_id'], first.data['dataset_id'])
+        self.assertEqual(second.data['rows'], 10)
+        self.assertEqual(Dataset.objects.count(), 1)
+        self.assertEqual(Equipment.objects.count(), 10)
+        self.assertFalse(any('INSERT' in q['sql'] for q in queries))
+
+    def test_source_hash_is_sha256_of_file(self):
+        content = make_csv(4)
+        dataset = Dataset.objects.get(id=self.upload(content).data['dataset_id'])
+        self.assertEqual(dataset.source_hash, hashlib.sha256(content).hexdigest())
+
+    def test_different_content_or_user_ingests(self):
+        first_id = self.upload(make_csv(10)).data['dataset_id']
+        self.assertNotEqual(self.upload(make_csv(11)).data['dataset_id'], first_id)
+        bob = User.objects.create_user('bob')
+        self.client.force_authenticate(bob)
+        response = self.upload(make_csv(10))
+        self.assertNotIn('duplicate', response.data)
+        self.assertNotEqual(response.data['dataset_id'], first_id)
+
+
+class StreamingCsvTests(UploadTestCase):
+    def test_lines_survive_chunk_boundaries(self):
+        data = 'a,b\n"x\ny",é\r\nlast'.encode('utf-8')
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        self.assertEqual(list(iter_text_lines(chunks)), ['a,b\n', '"x\n', 'y",é\r\n', 'last'])
+
+    def test_utf8_bom_is_stripped(self):
+        self.assertEqual(list(iter_text_lines([b'\xef\xbb\xbfa\n'])), ['a\n'])
+
+    def test_quoted_newline_upload(self):
+        content = (CSV_HEADER + '"Pump\nA",Pump,1,2,3\n').encode('utf-8')
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Equipment.objects.get().name, 'Pump\nA')
+
+
+class CompressedUploadTests(UploadTestCase):
+    def assert_ingested(self, response, rows):
+        self.assertEqual(response.status_code, 200, response.data)
+        dataset = Dataset.objects.get(id=response.data['dataset_id'])
+        self.assertEqual(list(dataset.equipment.order_by('id').values_list('name', flat=True)),
+                         [f'Pump-{i}' for i in range(rows)])
+
+    def test_compressed_formats(self):
+        for suffix, compress, rows in (('gz', gzip.compress, 11), ('bz2', bz2.compress, 12),
+                                       ('xz', lzma.compress, 13)):
+            with self.subTest(suffix):
+                self.assert_ingested(self.upload(compress(make_csv(rows)), name=f'plant.csv.{suffix}'), rows)
+
+    @skipUnless(ingest.zstandard is not None, 'zstandard not installed')
+    def test_zstd(self):
+        content = ingest.zstandard.ZstdCompressor().compress(make_csv(9))
+        self.assert_ingested(self.upload(content, name='plant.csv.zst'), 9)
+
+    def test_concatenated_gzip_members(self):
+        content = make_csv(20)
+        split = content.index(b'Pump-12')
+        self.assert_ingested(self.upload(gzip.compress(content[:split]) + gzip.compress(content[split:]),
+                                         name='plant.csv.gz'), 20)
+
+    def test_corrupt_archive_rolls_back(self):
+        content = gzip.compress(make_csv(2000))
+        response = self.upload(content[:len(content) // 2], name='plant.csv.gz')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('decompress', response.data['error'])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_unknown_extension_rejected(self):
+        response = self.upload(make_csv(3), name='plant.csv.zip')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('.csv.gz', response.data['error'])
+
+    def test_decompresses_in_bounded_blocks(self):
+        content = make_csv(1) + b'Pump-x,Pump,1,2,3\n' * 200000
+        blocks = list(ingest.decompressed_chunks(iter([gzip.compress(content)]), '.gz'))
+        self.assertEqual(b''.join(blocks), content)
+        self.assertLessEqual(max(len(block) for block in blocks), ingest.DECOMPRESS_READ_SIZE)
+
+    @override_settings(UPLOAD_INGEST_ASYNC=False, DATASET_RETENTION_ASYNC=False)
+    def test_chunked_compressed_upload(self):
+        content = gzip.compress(make_csv(30))
+        upload_id = self.client.post('/api/uploads/', {'filename': 'plant.csv.gz'}, format='json').data['upload_id']
+        pieces = [content[i:i + 50] for i in range(0, len(content), 50)]
+        for index, piece in enumerate(pieces):
+            self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', piece,
+                            content_type='application/octet-stream')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/uploads/{upload_id}/finalize/', {'total_chunks': len(pieces)}, format='json')
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['rows'], 30)
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0, CSV_PARALLEL_MIN_BYTES=0,
+                   CSV_PARALLEL_CHUNK_BYTES=256, CSV_PARALLEL_WORKERS=2)
+class ParallelIngestTests(UploadTestCase):
+    def test_parallel_ingest_preserves_file_order(self):
+        response = self.upload(make_csv(200))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['workers'], 2)
+        names = list(Equipment.objects.order_by('id').values_list('name', flat=True))
+        self.assertEqual(names, [f'Pump-{i}' for i in range(200)])
+
+    def test_quoted_newlines_fall_back_to_streaming(self):
+        content = make_csv(100) + b'"Pump\nB",Pump,1,2,3\n' + make_csv(100)[len(CSV_HEADER):]
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertNotIn('workers', response.data)
+        self.assertEqual(Equipment.objects.count(), 201)
+        self.assertTrue(Equipment.objects.filter(name='Pump\nB').exists())
+
+    def test_quoted_fields_without_newlines_stay_parallel(self):
+        content = make_csv(100) + b'"Pump, ""B""",Pump,1,2,3\n'
+        response = self.upload(content)
+        self.assertEqual(response.data['workers'], 2)
+        self.assertTrue(Equipment.objects.filter(name='Pump, "B"').exists())
+
+    def test_parallel_ingest_matches_streaming(self):
+        content = make_csv(200)
+        parallel = Dataset.objects.get(id=self.upload(content).data['dataset_id'])
+        Dataset.objects.filter(id=parallel.id).update(source_hash='')
+        with self.settings(CSV_PARALLEL_WORKERS=1):
+            response = self.upload(content)
+        self.assertNotIn('workers', response.data)
+        streamed = Dataset.objects.get(id=response.data['dataset_id'])
+        self.assertEqual(parallel.content_hash, streamed.content_hash)
+        self.assertEqual(parallel.summary.type_distribution, streamed.summary.type_distribution)
+        self.assertEqual(parallel.summary.temperature_mean, streamed.summary.temperature_mean)
+        self.assertEqual(load_columns(parallel.id).flowrate.tolist(), load_columns(streamed.id).flowrate.tolist())
+
+    def test_parallel_ingest_reports_bad_line(self):
+        response = self.upload(make_csv(200, bad_line=150))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Row 152', response.data['error'])
+        self.assertFalse(Dataset.objects.exists())
+
+
+class ColumnStoreTests(UploadTestCase):
+    def test_upload_writes_column_store(self):
+        dataset_id = self.upload(make_csv(10)).data['dataset_id']
+        columns = load_columns(dataset_id)
+        self.assertEqual(len(columns), 10)
+        self.assertEqual(columns.flowrate[3], 103.5)
+        self.assertEqual(list(columns.types[:2]), ['Valve', 'Pump'])
+
+    def test_failed_upload_leaves_no_store(self):
+        self.upload(make_csv(10, bad_line=5))
+        self.assertFalse(os.listdir(os.path.join(os.path.dirname(store_path(0)))))
+
+    def test_summary_builds_missing_store_from_rows(self):
+        dataset = Dataset.objects.create(name='legacy.csv', uploaded_by=self.user, file_path='legacy.csv')
+        Equipment.objects.create(dataset=dataset, name='P1', type='Pump', flowrate=10, pressure=2, temperature=50)
+        Equipment.objects.create(dataset=dataset, name='V1', type='Valve', flowrate=20, pressure=4, temperature=70)
+        response = self.client.get(f'/api/summary/{dataset.id}/')
+        self.assertEqual(response.data['avg_flowrate'], 15)
+        self.assertEqual(response.data['type_distribution'], {'Pump': 1, 'Valve': 1})
+        self.assertIsNotNone(load_columns(dataset.id))
+
+    def test_delete_removes_store(self):
+        dataset_id = self.upload(make_csv(3)).data['dataset_id']
+        with self.captureOnCommitCallbacks(execute=True):
+            Dataset.objects.get(id=dataset_id).delete()
+        self.assertFalse(os.path.exists(store_path(dataset_id)))
+
+    def test_report_renders(self):
+        dataset_id = self.upload(make_csv(20)).data['dataset_id']
+        response = self.client.get(f'/api/report/{dataset_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.getvalue().startswith(b'%PDF'))
+
+
+class DatasetSummaryTests(UploadTestCase):
+    def test_summary_computed_at_ingest(self):
+        with self.settings(CSV_INGEST_BATCH_SIZE=4):
+            dataset_id = self.upload(make_csv(10)).data['dataset_id']
+        summary = DatasetSummary.objects.get(pk=dataset_id)
+        flowrates = [100.5 + i for i in range(10)]
+        self.assertEqual(summary.count, 10)
+        self.assertAlmostEqual(summary.flowrate_mean, sum(flowrates) / 10)
+        self.assertAlmostEqual(summary.flowrate_std, 2.8722813232690143)
+        self.assertEqual(summary.temperature_max, 89)
+        self.assertEqual(summary.type_distribution, {'Valve': 5, 'Pump': 5})
+        self.assertAlmostEqual(summary.type_averages['Pump']['flowrate'], 105.5)
+
+    def test_summary_endpoint_is_single_query(self):
+        dataset_id = self.upload(make_csv(50)).data['dataset_id']
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/summary/{dataset_id}/')
+        self.assertEqual(response.data['total_count'], 50)
+        self.assertEqual(response.data['temperature']['min'], 80)
+
+    def test_summary_of_other_users_dataset_is_hidden(self):
+        dataset_id = self.upload(make_csv(5)).data['dataset_id']
+        self.client.force_authenticate(User.objects.create_user('bob', 'bob@example.com', 'pw'))
+        self.assertEqual(self.client.get(f'/api/summary/{dataset_id}/').status_code, 404)
+
+    def test_recompute_command(self):
+        dataset_id = self.upload(make_csv(6)).data['dataset_id']
+        DatasetSummary.objects.all().delete()
+        call_command('recompute_summaries', '--missing-only', stdout=open(os.devnull, 'w'))
+        self.assertEqual(DatasetSummary.objects.get(pk=dataset_id).count, 6)
+
+
+@override_settings(UPLOAD_INGEST_ASYNC=False, DATASET_RETENTION_ASYNC=False)
+class ChunkedUploadTests(UploadTestCase):
+    def start(self, filename='big.csv'):
+        response = self.client.post('/api/uploads/', {'filename': filename}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def put_chunk(self, upload_id, index, data):
+        return self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', data,
+                               content_type='application/octet-stream')
+
+    def finalize(self, upload_id, total_chunks):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload_id}/finalize/', {'total_chunks': total_chunks},
+                                        format='json')
+        return response
+
+    def send(self, content, size):
+        upload_id = self.start()
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        # Out of order, as parallel transfers arrive
+        for index in reversed(range(len(pieces))):
+            self.assertEqual(self.put_chunk(upload_id, index, pieces[index]).status_code, 200)
+        return upload_id, len(pieces)
+
+    def test_chunks_ingest_in_order(self):
+        content = make_csv(40)
+        upload_id, total = self.send(content, 97)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['received_chunks'], list(range(total)))
+        self.assertEqual(self.finalize(upload_id, total).status_code, 202)
+
+        session = self.client.get(f'/api/uploads/{upload_id}/').data
+        self.assertEqual((session['status'], session['rows']), ('done', 40))
+        dataset = Dataset.objects.get(id=session['dataset_id'])
+        self.assertEqual(list(dataset.equipment.order_by('id').values_list('name', flat=True)),
+                         [f'Pump-{i}' for i in range(40)])
+        # Same bytes as a single-request upload, so that resolves to this dataset
+        self.assertEqual(dataset.source_hash, hashlib.sha256(content).hexdigest())
+        self.assertTrue(self.upload(content).data['duplicate'])
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_SESSION_DIR, str(upload_id))))
+
+    def test_duplicate_recognised_before_parsing(self):
+        content = make_csv(12)
+        existing_id = self.upload(content).data['dataset_id']
+        upload_id, total = self.send(content, 128)
+        with patch('api.uploads.stream_csv') as stream_csv:
+            self.finalize(upload_id, total)
+        stream_csv.assert_not_called()
+        session = self.client.get(f'/api/uploads/{upload_id}/').data
+        self.assertEqual((session['status'], session['dataset_id'], session['rows']), ('done', existing_id, 12))
+
+    @override_settings(CSV_PARALLEL_MIN_BYTES=0, CSV_PARALLEL_CHUNK_BYTES=256, CSV_PARALLEL_WORKERS=2)
+    def test_large_upload_parsed_in_parallel(self):
+        upload_id, total = self.send(make_csv(200), 1000)
+        with patch('api.ingest.ingest_csv_parallel', wraps=ingest.ingest_csv_parallel) as parallel:
+            self.finalize(upload_id, total)
+        self.assertEqual(parallel.call_count, 1)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['rows'], 200)
+        self.assertEqual(list(Equipment.objects.order_by('id').values_list('name', flat=True)),
+                         [f'Pump-{i}' for i in range(200)])
+
+    def test_stale_sessions_expire(self):
+        ingesting = self.start()
+        self.put_chunk(ingesting, 0, make_csv(3))
+        # Left INGESTING by a server that went away mid-ingest
+        UploadSession.objects.filter(pk=ingesting).update(
+            status=UploadSession.INGESTING, updated_at=timezone.now() - timedelta(hours=25))
+        active = self.start()
+        UploadSession.objects.filter(pk=active).update(created_at=timezone.now() - timedelta(hours=25))
+        self.put_chunk(active, 0, make_csv(3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_sessions(), 1)
+        self.assertEqual([str(pk) for pk in UploadSession.objects.values_list('id', flat=True)], [str(active)])
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_SESSION_DIR, str(ingesting))))
+
+    def test_missing_chunks_reported(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, CSV_HEADER.encode())
+        self.put_chunk(upload_id, 2, b'P,Pump,1,2,3\n')
+        response = self.finalize(upload_id, 4)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing_chunks'], [1, 3])
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['status'], 'open')
+
+    def test_retried_chunk_replaces_previous(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, make_csv(3)[:-5])
+        self.put_chunk(upload_id, 0, make_csv(3))
+        self.finalize(upload_id, 1)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['rows'], 3)
+
+    def test_bad_row_fails_session(self):
+        upload_id, total = self.send(make_csv(10, bad_line=6), 64)
+        self.finalize(upload_id, total)
+        session = self.client.get(f'/api/uploads/{upload_id}/').data
+        self.assertEqual(session['status'], 'failed')
+        self.assertIn('Row 8', session['error'])
+        self.assertFalse(Dataset.objects.exists())
+        self.assertEqual(self.finalize(upload_id, total).status_code, 409)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'x').status_code, 409)
+
+    @override_settings(UPLOAD_CHUNK_MAX_BYTES=16)
+    def test_oversized_chunk_rejected(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, b'x' * 17).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['received_chunks'], [])
+
+    def test_other_users_session_not_found(self):
+        upload_id = self.start()
+        self.client.force_authenticate(User.objects.create_user('bob'))
+        self.assertEqual(self.put_chunk(upload_id, 0, b'x').status_code, 404)
+
+
+class AppendUploadTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(10)).data['dataset_id']
+
+    def append(self, content, dataset_id=None):
+        return self.client.post(f'/api/datasets/{dataset_id or self.dataset_id}/append/',
+                                {'file': SimpleUploadedFile('more.csv', content)}, format='multipart')
+
+    def more_rows(self):
+        return (CSV_HEADER + 'Mixer-1,Mixer,40.0,1.5,25\nPump-x,Pump,500.25,19,390\nValve-x,Valve,7,3,60\n').encode()
+
+    def test_append_matches_full_recompute(self):
+        response = self.append(self.more_rows())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rows'], response.data['total_rows']), (3, 13))
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        self.assertEqual(dataset.equipment.count(), 13)
+        self.assertEqual(len(load_columns(self.dataset_id)), 13)
+
+        stored = DatasetSummary.objects.get(pk=self.dataset_id)
+        expected = compute_summary(dataset, get_columns(dataset))
+        self.assertEqual(stored.count, 13)
+        self.assertEqual(stored.type_distribution, expected.type_distribution)
+        for param in ('flowrate', 'pressure', 'temperature'):
+            for stat in ('mean', 'std', 'min', 'max'):
+                self.assertAlmostEqual(getattr(stored, f'{param}_{stat}'), getattr(expected, f'{param}_{stat}'))
+            for name, averages in expected.type_averages.items():
+                self.assertAlmostEqual(stored.type_averages[name][param], averages[param])
+
+    def test_append_reads_only_new_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.append(self.more_rows())
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'api_equipment' in q['sql'] for q in queries))
+
+    def test_append_chains_hashes(self):
+        before = Dataset.objects.get(id=self.dataset_id)
+        self.append(self.more_rows())
+        after = Dataset.objects.get(id=self.dataset_id)
+        self.assertNotEqual(after.content_hash, before.content_hash)
+        self.assertEqual(after.source_hash, '')
+        # The original file is no longer this dataset's contents
+        self.assertNotEqual(self.upload(make_csv(10)).data['dataset_id'], self.dataset_id)
+
+    def test_bad_row_rolls_back_append(self):
+        response = self.append(make_csv(6, bad_line=4))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Equipment.objects.filter(dataset_id=self.dataset_id).count(), 10)
+        self.assertEqual(DatasetSummary.objects.get(pk=self.dataset_id).count, 10)
+        self.assertEqual(len(load_columns(self.dataset_id)), 10)
+
+    def test_other_users_dataset_not_found(self):
+        self.client.force_authenticate(User.objects.create_user('bob'))
+        self.assertEqual(self.append(self.more_rows()).status_code, 404)
+
+
+class StatsEngineTests(TestCase):
+    def test_matches_numpy_reference(self):
+        rng = np.random.default_rng(0)
+        flowrate, pressure, temperature = rng.uniform(0, 100, (3, 1000))
+        codes = rng.integers(0, 3, 1000)
+        stats = compute_stats(flowrate, pressure, temperature, codes, ['Pump', 'Valve', 'Reactor'])
+        self.assertAlmostEqual(stats['temperature']['std'], np.std(temperature))
+        self.assertAlmostEqual(stats['pressure']['percentiles']['p90'], np.percentile(pressure, 90))
+        threshold = temperature.mean() + temperature.std()
+        self.assertEqual(stats['temperature']['high_count'], int((temperature > threshold).sum()))
+        self.assertEqual(stats['type_distribution']['Valve'], int((codes == 1).sum()))
+        self.assertAlmostEqual(stats['type_averages']['Reactor']['flowrate'], flowrate[codes == 2].mean())
+
+    def test_empty_input(self):
+        stats = compute_stats([], [], [], np.array([], dtype=int), [])
+        self.assertEqual(stats['count'], 0)
+        self.assertIsNone(stats['flowrate']['mean'])
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('carol', 'carol@example.com', 'secret')
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/api/login/', {'username': 'carol', 'password': 'secret'}, format='json')
+
+    def test_login_issues_usable_token(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/datasets/').status_code, 200)
+
+    def test_token_check_skips_password_hashing(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.UnsaltedMD5PasswordHasher']):
+            # The stored PBKDF2 hash could not be verified with only this hasher
+            self.assertEqual(self.client.get('/api/datasets/').status_code, 200)
+
+    def test_bad_credentials_rejected(self):
+        response = self.client.post('/api/login/', {'username': 'carol', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/login/', {'username': 'nobody', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_tampered_and_expired_tokens_rejected(self):
+        token = issue_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEqual(self.client.get('/api/datasets/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.settings(API_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.client.get('/api/datasets/').status_code, 401)
+
+    def test_password_change_revokes_token(self):
+        token = issue_token(self.user)
+        self.user.set_password('changed')
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/datasets/').status_code, 401)
+
+    def test_challenge_matches_client(self):
+        self.assertEqual(self.client.get('/api/datasets/')['WWW-Authenticate'], 'Basic realm="api"')
+        self.client.credentials(HTTP_AUTHORIZATION='Basic Y2Fyb2w6bm9wZQ==')
+        self.assertEqual(self.client.get('/api/datasets/')['WWW-Authenticate'], 'Basic realm="api"')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(self.client.get('/api/datasets/')['WWW-Authenticate'], 'Bearer')
+
+    def test_basic_auth_still_accepted(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Basic Y2Fyb2w6c2VjcmV0')
+        self.assertEqual(self.client.get('/api/datasets/').status_code, 200)
+
+
+class DatasetCatalogTests(UploadTestCase):
+    def make_datasets(self, n):
+        for i in range(n):
+            dataset = Dataset.objects.create(name=f'd{i}.csv', uploaded_by=self.user, file_path=f'd{i}.csv')
+            Equipment.objects.create(dataset=dataset, name='P', type='Pump', flowrate=1, pressure=1, temperature=1)
+
+    def test_count_queries_do_not_grow_with_datasets(self):
+        self.make_datasets(2)
+        with self.assertNumQueries(1):
+            self.client.get('/api/datasets/')
+        self.make_datasets(8)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/datasets/')
+        self.assertEqual([d['equipment_count'] for d in response.data], [1] * 10)
+
+    def test_keyset_pages_cover_catalog_in_order(self):
+        self.make_datasets(7)
+        expected = list(Dataset.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True))
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get('/api/datasets/', params)
+            seen += [d['id'] for d in response.data]
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+            self.assertIn('rel="next"', response['Link'])
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_rejected(self):
+        self.assertEqual(self.client.get('/api/datasets/', {'cursor': 'garbage'}).status_code, 400)
+
+    def test_cursor_with_invalid_values_rejected(self):
+        for values in (['garbage', 1], [None, 'x'], [[1], {}]):
+            with self.subTest(values):
+                response = self.client.get('/api/datasets/', {'cursor': encode_cursor(values)})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], 'Invalid cursor')
+
+
+class EquipmentDataTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(25)).data['dataset_id']
+        self.url = f'/api/equipment/{self.dataset_id}/'
+
+    def test_stream_matches_serializer_output(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        expected = EquipmentSerializer(Equipment.objects.order_by('id'), many=True).data
+        self.assertEqual(body, json.loads(json.dumps(expected)))
+
+    def test_stream_projection(self):
+        with self.settings(EQUIPMENT_STREAM_CHUNK_SIZE=4):
+            response = self.client.get(self.url, {'fields': 'name,temperature'})
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body), 25)
+        self.assertEqual(body[3], {'name': 'Pump-3', 'temperature': 83.0})
+
+    def test_cursor_pages(self):
+        names, cursor = [], None
+        while True:
+            params = {'limit': 10, 'fields': 'name', **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(set(response.data[0]), {'name'})
+            names += [row['name'] for row in response.data]
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(names, [f'Pump-{i}' for i in range(25)])
+
+    def test_unknown_field_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'fields': 'password'}).status_code, 400)
+
+    def test_cursor_with_invalid_values_rejected(self):
+        for values in (['x'], [[1]], [1, 2]):
+            with self.subTest(values):
+                response = self.client.get(self.url, {'cursor': encode_cursor(values)})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], 'Invalid cursor')
+
+
+@skipUnless(settings.DATABASES['default']['ENGINE'] == 'api.backends.sqlite3', 'production SQLite profile disabled')
+@override_settings(DATASET_RETENTION_ASYNC=False)
+class AppendLockTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media.name, COLUMN_STORE_ROOT=os.path.join(media.name, 'columns'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('alice'))
+
+    def test_append_takes_write_lock_before_reading_dataset(self):
+        dataset_id = self.client.post('/api/upload/', {'file': SimpleUploadedFile('plant.csv', make_csv(5))},
+                                      format='multipart').data['dataset_id']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/api/datasets/{dataset_id}/append/',
+                                        {'file': SimpleUploadedFile('more.csv', make_csv(3))}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        sql = [q['sql'] for q in queries]
+        # Appends are ordered by the write lock, which has to be held before
+        # the dataset (and from it the column store position) is read
+        begin = sql.index('BEGIN IMMEDIATE')
+        dataset_read = next(i for i, q in enumerate(sql) if q.startswith('SELECT') and 'FROM "api_dataset"' in q)
+        self.assertLess(begin, dataset_read)
+        self.assertEqual(DatasetSummary.objects.get(pk=dataset_id).count, 8)
+
+
+class ColumnarWireFormatTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(12)).data['dataset_id']
+        self.url = f'/api/equipment/{self.dataset_id}/'
+
+    def test_accept_header_selects_columnar_format(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/vnd.chemora.columns')
+        self.assertEqual(response['Content-Type'], 'application/vnd.chemora.columns')
+        data = decode_columns(response.content)
+        rows = list(Equipment.objects.order_by('id').values_list('id', 'name', 'type', 'temperature'))
+        self.assertEqual(data['id'].tolist(), [r[0] for r in rows])
+        self.assertEqual(data['name'], [r[1] for r in rows])
+        self.assertEqual(data['type'].tolist(), [r[2] for r in rows])
+        self.assertEqual(data['temperature'].tolist(), [r[3] for r in rows])
+        self.assertEqual(data['dataset'].tolist(), [self.dataset_id] * 12)
+
+    def test_projection_skips_row_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'format': 'columns', 'fields': 'flowrate,type'})
+        data = decode_columns(response.content)
+        self.assertEqual(list(data), ['flowrate', 'type'])
+        self.assertEqual(data['flowrate'][0], 100.5)
+
+    def test_store_out_of_step_served_from_table(self):
+        Equipment.objects.create(dataset_id=self.dataset_id, name='Mixer-1', type='Mixer', flowrate=1.5,
+                                 pressure=2, temperature=3)
+        response = self.client.get(self.url, {'format': 'columns', 'fields': 'id,type,flowrate'})
+        data = decode_columns(response.content)
+        rows = list(Equipment.objects.order_by('id').values_list('id', 'type', 'flowrate'))
+        self.assertEqual(data['id'].tolist(), [r[0] for r in rows])
+        self.assertEqual(data['type'].tolist(), [r[1] for r in rows])
+        self.assertEqual(data['flowrate'].tolist(), [r[2] for r in rows])
+        # A read never rewrites the store
+        self.assertEqual(len(load_columns(self.dataset_id)), 12)
+
+    def test_json_remains_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_errors_are_labelled_json(self):
+        response = self.client.get(self.url, {'fields': 'nope'}, HTTP_ACCEPT='application/vnd.chemora.columns')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('error', json.loads(response.content))
+
+
+@override_settings(REPORT_WORKERS=0)
+class ReportJobTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(12)).data['dataset_id']
+
+    def enqueue(self):
+        return self.client.post('/api/reports/', {'dataset_id': self.dataset_id}, format='json')
+
+    def test_job_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.enqueue()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], ReportJob.PENDING)
+
+        job_url = f"/api/reports/{response.data['job_id']}/"
+        status_data = self.client.get(job_url).data
+        self.assertEqual(status_data['status'], ReportJob.DONE)
+        self.assertTrue(status_data['download_url'].endswith('/download/'))
+
+        download = self.client.get(job_url + 'download/')
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    def test_download_before_done_conflicts(self):
+        job_id = self.enqueue().data['job_id']
+        response = self.client.get(f'/api/reports/{job_id}/download/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_repeat_request_joins_active_job(self):
+        first = self.enqueue().data['job_id']
+        self.assertEqual(self.enqueue().data['job_id'], first)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_stale_job_is_not_joined(self):
+        stale = ReportJob.objects.create(dataset_id=self.dataset_id, requested_by=self.user,
+                                         status=ReportJob.RUNNING,
+                                         started_at=timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT + 1))
+        job_id = self.enqueue().data['job_id']
+        self.assertNotEqual(job_id, str(stale.pk))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ReportJob.FAILED)
+        self.assertEqual(self.client.get(f'/api/reports/{stale.pk}/').data['status'], ReportJob.FAILED)
+
+    def test_recent_running_job_is_joined(self):
+        running = ReportJob.objects.create(dataset_id=self.dataset_id, requested_by=self.user,
+                                           status=ReportJob.RUNNING, started_at=timezone.now())
+        self.assertEqual(self.enqueue().data['job_id'], str(running.pk))
+
+    def test_jobs_are_private(self):
+        job_id = self.enqueue().data['job_id']
+        self.client.force_authenticate(User.objects.create_user('bob', 'bob@example.com', 'secret'))
+        self.assertEqual(self.client.get(f'/api/reports/{job_id}/').status_code, 404)
+        response = self.client.post('/api/reports/', {'dataset_id': self.dataset_id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ReportCacheTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(12)).data['dataset_id']
+        self.url = f'/api/report/{self.dataset_id}/'
+
+    @override_settings(CSV_INGEST_BATCH_SIZE=5)
+    def test_content_hash_ignores_batching(self):
+        other = Dataset.objects.get(id=self.upload(make_csv(12)).data['dataset_id'])
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        self.assertEqual(len(dataset.content_hash), 64)
+        self.assertEqual(other.content_hash, dataset.content_hash)
+        # Datasets ingested before the field existed hash their rows on demand
+        dataset.content_hash = ''
+        self.assertEqual(get_content_hash(dataset), other.content_hash)
+
+    def test_repeat_download_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(os.listdir(cache_root())), 1)
+        body = b''.join(first.streaming_content)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+        second = self.client.get(self.url)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(b''.join(second.streaming_content), body)
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_changed_content_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Dataset.objects.filter(id=self.dataset_id).update(content_hash='0' * 64)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_lru_eviction(self):
+        os.makedirs(cache_root())
+        for i, name in enumerate(['old', 'recent', 'newest']):
+            path = os.path.join(cache_root(), f'{name}.pdf')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        self.assertEqual(evict(max_bytes=250), 1)
+        self.assertEqual(sorted(os.listdir(cache_root())), ['newest.pdf', 'recent.pdf'])
+
+
+class ChartRenderingTests(SimpleTestCase):
+    specs = [
+        ChartSpec({'x': ['Pump', 'Valve'], 'y': [3, 5]}, 'pie', 'Types', '', '', 'types'),
+        ChartSpec({'x': ['A', 'B', 'C'], 'y': [1.5, 2.5, 0.5]}, 'bar', 'Flow', 'Unit', 'L/min', 'flow'),
+        ChartSpec({'x': np.arange(50.0), 'y': np.arange(50.0) ** 0.5}, 'scatter', 'P/T', 'bar', 'C', 'scatter'),
+    ]
+
+    @override_settings(REPORT_CHART_WORKERS=2)
+    def test_pool_matches_serial_rendering(self):
+        self.assertEqual(render_charts(self.specs), [render_chart(spec) for spec in self.specs])
+
+    def test_concurrent_threads_render_identical_charts(self):
+        expected = [render_chart(spec) for spec in self.specs]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            rendered = list(pool.map(render_chart, self.specs * 8))
+        self.assertEqual(rendered, expected * 8)
+
+    @override_settings(REPORT_CHART_WORKERS=1)
+    def test_vector_mode_draws_natively_with_raster_fallback(self):
+        big = np.arange(MAX_VECTOR_POINTS + 1.0)
+        specs = self.specs + [ChartSpec({'x': big, 'y': big}, 'scatter', 'Big', 'x', 'y', 'big')]
+        flowables = chart_flowables([(spec, 300, 200) for spec in specs], mode='vector', dpi=50)
+        self.assertEqual([type(f).__name__ for f in flowables], ['Drawing', 'Drawing', 'Drawing', 'Image'])
+        rasters = chart_flowables([(spec, 300, 200) for spec in self.specs], mode='raster', dpi=50)
+        self.assertEqual({type(f).__name__ for f in rasters}, {'Image'})
+
+    def test_large_scatter_becomes_density_grid(self):
+        n = LARGE_N_POINTS + 1
+        spec = aggregate_spec(ChartSpec({'x': np.arange(n) % 7.0, 'y': np.arange(n) % 5.0}, 'scatter', 'P/T', 'bar', 'C', 's'))
+        self.assertEqual(spec.chart_type, 'density')
+        self.assertEqual(spec.data['counts'].sum(), n)
+        self.assertEqual(aggregate_spec(self.specs[2]), self.specs[2])
+
+    def test_envelope_keeps_extremes(self):
+        values = np.zeros(100000)
+        values[12345] = 9.0
+        values[77777] = -4.0
+        envelope = minmax_envelope(values, buckets=100)
+        self.assertEqual(len(envelope['x']), 100)
+        self.assertEqual(envelope['high'].max(), 9.0)
+        self.assertEqual(envelope['low'].min(), -4.0)
+        self.assertEqual(envelope['high'][12], 9.0)
+        self.assertEqual(minmax_envelope(np.arange(3.0))['high'].tolist(), [0.0, 1.0, 2.0])
+
+    @override_settings(REPORT_CHART_WORKERS=1)
+    def test_serial_rendering_keeps_order(self):
+        images = render_charts(self.specs)
+        self.assertEqual(len(images), 3)
+        self.assertTrue(all(image.startswith(b'\x89PNG') for image in images))
+
+
+class ReportQueryCountTests(UploadTestCase):
+    def report_queries(self, rows):
+        dataset = Dataset.objects.get(id=self.upload(make_csv(rows)).data['dataset_id'])
+        with CaptureQueriesContext(connection) as queries:
+            build_report(dataset, io.BytesIO())
+        return len(queries)
+
+    @override_settings(REPORT_CHART_WORKERS=1)
+    def test_query_count_independent_of_dataset_size(self):
+        self.assertEqual(self.report_queries(5), 1)
+        self.assertEqual(self.report_queries(200), 1)
+
+    @override_settings(REPORT_CHART_WORKERS=1)
+    def test_report_endpoint_query_count_constant(self):
+        counts = []
+        for rows in (5, 200):
+            dataset_id = self.upload(make_csv(rows)).data['dataset_id']
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(f'/api/report/{dataset_id}/').status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class AggregationTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(11)).data['dataset_id']
+        self.url = f'/api/aggregate/{self.dataset_id}/'
+
+    def expected(self, eq_type, field):
+        return np.array(Equipment.objects.filter(type=eq_type).values_list(field, flat=True))
+
+    def test_group_by_type_on_columns(self):
+        response = self.client.get(self.url, {'metrics': 'count,mean,std,min,max,p50,p90'})
+        self.assertEqual(response.status_code, 200)
+        groups = {g['type']: g for g in response.data['groups']}
+        self.assertEqual(list(groups), ['Pump', 'Valve'])
+        for eq_type, group in groups.items():
+            values = self.expected(eq_type, 'temperature')
+            self.assertEqual(group['count'], len(values))
+            self.assertEqual(list(group['temperature']), ['mean', 'std', 'min', 'max', 'p50', 'p90'])
+            self.assertAlmostEqual(group['temperature']['mean'], values.mean())
+            self.assertAlmostEqual(group['temperature']['std'], values.std())
+            self.assertEqual(group['temperature']['min'], values.min())
+            self.assertAlmostEqual(group['temperature']['p90'], np.percentile(values, 90))
+
+    def test_sql_group_by_without_column_store(self):
+        expected = self.client.get(self.url, {'metrics': 'count,mean,max', 'fields': 'flowrate'}).data['groups']
+        delete_columns(self.dataset_id)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'metrics': 'count,mean,max', 'fields': 'flowrate'})
+        self.assertEqual(response.data['groups'], expected)
+        self.assertIsNone(load_columns(self.dataset_id))
+
+    def test_invalid_parameters_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'metrics': 'median'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'fields': 'name'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'group_by': 'name'}).status_code, 400)
+
+
+class EquipmentFilterTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_id = self.upload(make_csv(12)).data['dataset_id']
+        self.url = f'/api/equipment/{self.dataset_id}/'
+
+    def names(self, params):
+        return [row['name'] for row in json.loads(b''.join(self.client.get(self.url, params).streaming_content))]
+
+    def test_type_and_range_filters(self):
+        self.assertEqual(self.names({'type': 'Pump', 'temperature_min': 88}), ['Pump-9', 'Pump-11'])
+        self.assertEqual(len(self.names({'type': 'Pump,Valve'})), 12)
+        self.assertEqual(self.names({'flowrate_min': 100, 'flowrate_max': 101.5}), ['Pump-0', 'Pump-1'])
+
+    def test_filters_apply_to_pages_and_columns(self):
+        params = {'type': 'Valve', 'pressure_max': 5}
+        expected = self.names(params)
+        page = self.client.get(self.url, {**params, 'limit': 100}).data
+        self.assertEqual([row['name'] for row in page], expected)
+        data = decode_columns(self.client.get(self.url, {**params, 'format': 'columns'}).content)
+        self.assertEqual(data['name'], expected)
+        self.assertEqual(set(data['type'].tolist()), {'Valve'})
+        self.assertTrue((data['pressure'] <= 5).all())
+
+    def test_invalid_bound_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'temperature_min': 'hot'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'temperature_min': 'nan'}).status_code, 400)
+
+
+@override_settings(DATASET_RETENTION_ASYNC=False, DATASET_RETENTION_MAX_PER_USER=3)
+class RetentionTests(UploadTestCase):
+    def make_dataset(self, days_old, rows=0, user=None):
+        dataset = Dataset.objects.create(name=f'{days_old}d.csv', uploaded_by=user or self.user, file_path='')
+        Dataset.objects.filter(pk=dataset.pk).update(uploaded_at=timezone.now() - timedelta(days=days_old))
+        DatasetSummary.objects.create(dataset=dataset, count=rows)
+        return dataset.id
+
+    def test_upload_purges_oldest_after_commit(self):
+        for days_old in (9, 8, 7):
+            self.make_dataset(days_old)
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset_id = self.upload(make_csv(5)).data['dataset_id']
+        names = list(Dataset.objects.filter(uploaded_by=self.user).values_list('name', flat=True))
+        self.assertEqual(names, ['plant.csv', '7d.csv', '8d.csv'])
+        self.assertEqual(Equipment.objects.filter(dataset_id=dataset_id).count(), 5)
+
+    def test_count_limit_is_per_user(self):
+        bob = User.objects.create_user('bob')
+        alice_ids = [self.make_dataset(days_old) for days_old in (1, 2, 3, 4, 5)]
+        for days_old in (1, 2):
+            self.make_dataset(days_old, user=bob)
+        self.assertEqual(expired_dataset_ids(), alice_ids[3:])
+        self.assertEqual(expired_dataset_ids(bob.id), [])
+
+    def test_age_limit(self):
+        self.make_dataset(1)
+        old = self.make_dataset(40)
+        policy = RetentionPolicy(max_per_user=0, max_age_days=30, max_rows=0)
+        self.assertEqual(expired_dataset_ids(policy=policy), [old])
+
+    def test_row_limit_keeps_newest_dataset(self):
+        newest, middle, oldest = self.make_dataset(1, 800), self.make_dataset(2, 150), self.make_dataset(3, 100)
+        policy = RetentionPolicy(max_per_user=0, max_age_days=0, max_rows=1000)
+        self.assertEqual(expired_dataset_ids(policy=policy), [oldest])
+        policy = RetentionPolicy(max_per_user=0, max_age_days=0, max_rows=500)
+        self.assertEqual(expired_dataset_ids(policy=policy), sorted([middle, oldest]))
+
+    def test_purge_deletes_rows_without_loading_them(self):
+        dataset_id = self.upload(make_csv(50)).data['dataset_id']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_datasets([dataset_id]), 1)
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'api_equipment' in q['sql'] for q in queries))
+        self.assertFalse(Equipment.objects.filter(dataset_id=dataset_id).exists())
+        self.assertFalse(DatasetSummary.objects.filter(dataset_id=dataset_id).exists())
+
+    def test_purge_command(self):
+        ids = [self.make_dataset(days_old) for days_old in (1, 2, 3, 4)]
+        out = io.StringIO()
+        call_command('purge_datasets', '--dry-run', stdout=out)
+        self.assertIn(str([ids[3]]), out.getvalue())
+        self.assertEqual(Dataset.objects.count(), 4)
+        call_command('purge_datasets', stdout=io.StringIO())
+        self.assertEqual(sorted(Dataset.objects.values_list('id', flat=True)), ids[:3])
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class EquipmentQueryPlanTests(TestCase):
+    """Each supported filter must be answered from an index, never a table scan"""
+
+    def plan(self, params):
+        queryset = EquipmentFilter.from_params(params).apply(Equipment.objects.filter(dataset_id=1))
+        return queryset.order_by('id').explain()
+
+    def assertIndexed(self, params, index):
+        plan = self.plan(params)
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('SCAN api_equipment', plan)
+
+    def test_type_equality_and_in(self):
+        self.assertIndexed({'type': 'Pump'}, 'api_equip_dataset_type_idx')
+        self.assertIndexed({'type': 'Pump,Valve'}, 'api_equip_dataset_type_idx')
+
+    def test_numeric_ranges(self):
+        self.assertIndexed({'flowrate_min': '10'}, 'api_equip_dataset_flow_idx')
+        self.assertIndexed({'pressure_min': '1', 'pressure_max': '5'}, 'api_equip_dataset_press_idx')
+        self.assertIndexed({'temperature_max': '100'}, 'api_equip_dataset_temp_idx')
+
+    def test_type_with_range(self):
+        plan = self.plan({'type': 'Pump', 'temperature_min': '100'})
+        self.assertIn('USING INDEX api_equip_dataset_', plan)
+        self.assertNotIn('SCAN api_equipment', plan)
+
+
+@skipUnless(settings.DATABASES['default']['ENGINE'] == 'api.backends.sqlite3', 'production SQLite profile disabled')
+class SqliteProfileTests(SimpleTestCase):
+    def open_wrapper(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        wrapper = SqliteWrapper({**connection.settings_dict, 'NAME': os.path.join(tmp.name, 'db.sqlite3')})
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.open_wrapper()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_transactions_take_write_lock_at_begin(self):
+        wrapper = self.open_wrapper()
+        wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(wrapper.settings_dict['NAME'], timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            other.execute('BEGIN IMMEDIATE')
+        wrapper.cursor().execute('ROLLBACK')
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
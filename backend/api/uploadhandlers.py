@@ -0,0 +1,41 @@
+"""SHA-256 of uploaded files, computed while the request body streams in.
+
+HashingUploadHandler sits first in FILE_UPLOAD_HANDLERS and passes every
+chunk on untouched to the memory/temporary-file handlers after it, so the
+digest costs no extra pass over the file. upload_digest() falls back to
+reading the file back when the handler isn't installed.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Record each uploaded file's SHA-256 in request.upload_digests[field_name]"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_digests'):
+                self.request.upload_digests = {}
+            self.request.upload_digests[self.field_name] = self.digest.hexdigest()
+        # Let the next handler build the file object
+        return None
+
+
+def upload_digest(request, field_name, uploaded_file):
+    digests = getattr(request, 'upload_digests', {})
+    if field_name in digests:
+        return digests[field_name]
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
@@ -0,0 +1,241 @@
+"""Turning uploaded CSV files into datasets, in one request or in chunks.
+
+Large files can be sent as a resumable chunked upload instead of a single
+multipart request:
+
+    POST /api/uploads/                     {"filename"} -> {"upload_id", "chunk_size", ...}
+    PUT  /api/uploads/<id>/chunks/<n>/     raw bytes of chunk n (numbered from 0)
+    GET  /api/uploads/<id>/                status, received chunks, dataset once ingested
+    POST /api/uploads/<id>/finalize/       {"total_chunks"}
+
+Each chunk is spooled to its own file under UPLOAD_SESSION_DIR and renamed
+into place only once complete, so chunks can arrive in any order and in
+parallel, a retried PUT simply replaces its chunk, and a client that lost its
+connection asks which chunks arrived and sends only the rest. Finalize
+ingests on a background thread (UPLOAD_INGEST_ASYNC) so the request returns
+before a multi-GB ingest does: the chunks are concatenated into one file and
+hashed in the same pass, so a file uploaded before is recognised without
+being parsed, and a new one is ingested like a single-request upload spooled
+to disk (across the process pool when it is large enough).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .ingest import REQUIRED_COLUMNS, IngestError, ingest_upload, missing_columns, stream_csv
+from .models import Dataset, UploadSession
+from .retention import schedule_sweep
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_UPLOAD_CHUNK_MAX_BYTES = 64 * 1024 * 1024
+MAX_UPLOAD_CHUNKS = 100000
+READ_SIZE = 64 * 1024
+ASSEMBLE_READ_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _resolve_duplicate(user, source_hash):
+    """The user's dataset already made from these bytes, moved to the top of their catalog, or None"""
+    existing = Dataset.objects.filter(uploaded_by=user, source_hash=source_hash).select_related('summary').first()
+    if existing is not None:
+        Dataset.objects.filter(pk=existing.pk).update(uploaded_at=timezone.now())
+    return existing
+
+
+def ingest_new_dataset(user, uploaded_file, source_hash):
+    """Ingest `uploaded_file` as a new dataset of `user` and return (dataset, stats).
+
+    A file whose bytes the user has uploaded before resolves to the dataset it
+    already produced, which moves to the top of their catalog as a new upload
+    would; stats then holds only its row count and 'duplicate': True.
+    """
+    existing = _resolve_duplicate(user, source_hash)
+    if existing is not None:
+        summary = getattr(existing, 'summary', None)
+        return existing, {'rows': summary.count if summary else existing.equipment.count(), 'duplicate': True}
+
+    # Stream the CSV file chunk by chunk instead of reading it into memory
+    csv_reader = stream_csv(uploaded_file)
+    if missing_columns(csv_reader.fieldnames):
+        raise IngestError(f'CSV must contain columns: {REQUIRED_COLUMNS}')
+
+    # Everything below runs in one transaction: a bad row rolls back the
+    # whole dataset
+    with transaction.atomic():
+        dataset = Dataset.objects.create(
+            name=uploaded_file.name,
+            uploaded_by=user,
+            file_path=uploaded_file.name,
+            source_hash=source_hash
+        )
+        # Create equipment records in bulk_create batches (large files
+        # are parsed across a process pool first)
+        stats = ingest_upload(dataset, uploaded_file, csv_reader)
+
+        # Older datasets past the retention limits are purged in the
+        # background once this one is committed
+        user_id = user.id
+        transaction.on_commit(lambda: schedule_sweep(user_id))
+    return dataset, stats
+
+
+def session_root():
+    return getattr(settings, 'UPLOAD_SESSION_DIR', os.path.join(settings.MEDIA_ROOT, 'upload_sessions'))
+
+
+def session_path(session_id):
+    return os.path.join(session_root(), str(session_id))
+
+
+def chunk_path(session_id, index):
+    return os.path.join(session_path(session_id), f'{index:06d}.chunk')
+
+
+def get_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', DEFAULT_UPLOAD_CHUNK_SIZE)
+
+
+def get_chunk_max_bytes():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_BYTES', DEFAULT_UPLOAD_CHUNK_MAX_BYTES)
+
+
+def write_chunk(session_id, index, stream):
+    """Spool chunk `index` from the file-like `stream`; returns its size in bytes"""
+    if not 0 <= index < MAX_UPLOAD_CHUNKS:
+        raise ValueError(f'Chunk index must be between 0 and {MAX_UPLOAD_CHUNKS - 1}')
+    max_bytes = get_chunk_max_bytes()
+    path = chunk_path(session_id, index)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Concurrent retries of the same chunk each write their own file; the last rename wins
+    partial_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+    size = 0
+    try:
+        with open(partial_path, 'wb') as f:
+            while True:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                size += len(data)
+                if size > max_bytes:
+                    raise ValueError(f'Chunks may be at most {max_bytes} bytes')
+                f.write(data)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return size
+
+
+def received_chunks(session_id):
+    """Indices of the complete chunks spooled for a session, in order"""
+    try:
+        names = os.listdir(session_path(session_id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len('.chunk')]) for name in names if name.endswith('.chunk'))
+
+
+def delete_session_files(session_id):
+    shutil.rmtree(session_path(session_id), ignore_errors=True)
+
+
+def assembled_path(session_id):
+    return os.path.join(session_path(session_id), 'upload')
+
+
+def assemble_chunks(session_id, total_chunks):
+    """Concatenate a session's chunks into one file; returns its path and SHA-256.
+
+    Each chunk is removed once copied, so the upload needs at most one extra
+    chunk of disk space.
+    """
+    digest = hashlib.sha256()
+    path = assembled_path(session_id)
+    with open(path, 'wb') as out:
+        for index in range(total_chunks):
+            with open(chunk_path(session_id, index), 'rb') as f:
+                for data in iter(lambda: f.read(ASSEMBLE_READ_SIZE), b''):
+                    digest.update(data)
+                    out.write(data)
+            os.remove(chunk_path(session_id, index))
+    return path, digest.hexdigest()
+
+
+class AssembledFile(File):
+    """A reassembled upload on disk, read the way a TemporaryUploadedFile is"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def missing_chunks(session_id, total_chunks):
+    return sorted(set(range(total_chunks)) - set(received_chunks(session_id)))
+
+
+def ingest_session(session_id):
+    """Ingest a finalized session's chunks; runs on the ingest thread (or inline)"""
+    session = UploadSession.objects.select_related('user').get(pk=session_id)
+    try:
+        # Hashed on the way, so a duplicate is found before anything is parsed
+        path, source_hash = assemble_chunks(session_id, session.total_chunks)
+        with AssembledFile(open(path, 'rb'), name=session.filename) as upload:
+            dataset, stats = ingest_new_dataset(session.user, upload, source_hash)
+    except Exception as e:
+        logger.info('Upload session %s failed: %s', session_id, e)
+        UploadSession.objects.filter(pk=session_id).update(
+            status=UploadSession.FAILED, error=str(e), finished_at=timezone.now(), updated_at=timezone.now())
+    else:
+        UploadSession.objects.filter(pk=session_id).update(
+            status=UploadSession.DONE, dataset=dataset, rows=stats['rows'], finished_at=timezone.now(),
+            updated_at=timezone.now())
+    finally:
+        delete_session_files(session_id)
+
+
+def _run_ingest(session_id):
+    try:
+        ingest_session(session_id)
+    except Exception:
+        logger.exception('Upload session %s ingest crashed', session_id)
+    finally:
+        connections.close_all()
+
+
+def submit_ingest(session_id):
+    """Start ingesting a finalized session; call once its INGESTING status is committed"""
+    global _executor
+    if not getattr(settings, 'UPLOAD_INGEST_ASYNC', True):
+        ingest_session(session_id)
+        return
+    with _executor_lock:
+        # One ingest at a time: they all queue on the database's write lock anyway
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-ingest')
+        executor = _executor
+    executor.submit(_run_ingest, session_id)
+
+
+def expire_sessions(max_age=None):
+    """Delete sessions (and their chunks) idle for longer than `max_age`.
+
+    This includes sessions left INGESTING: their ingest thread only lives in
+    memory, so after a restart nothing would ever finish or clean them up.
+    """
+    if max_age is None:
+        max_age = timedelta(hours=getattr(settings, 'UPLOAD_SESSION_MAX_AGE_HOURS', 24))
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    deleted, _ = stale.delete()
+    return deleted
@@ -5,8 +5,17 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('uploads/', views.create_upload_session, name='create_upload_session'),
+    path('uploads/<uuid:upload_id>/', views.upload_session_status, name='upload_session_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.put_upload_chunk, name='put_upload_chunk'),
+    path('uploads/<uuid:upload_id>/finalize/', views.finalize_upload_session, name='finalize_upload_session'),
     path('datasets/', views.get_datasets, name='get_datasets'),
+    path('datasets/<int:dataset_id>/append/', views.append_csv, name='append_csv'),
     path('equipment/<int:dataset_id>/', views.get_equipment_data, name='get_equipment_data'),
     path('summary/<int:dataset_id>/', views.get_summary, name='get_summary'),
+    path('aggregate/<int:dataset_id>/', views.get_aggregates, name='get_aggregates'),
     path('report/<int:dataset_id>/', views.generate_pdf_report, name='generate_pdf_report'),
+    path('reports/', views.create_report_job, name='create_report_job'),
+    path('reports/<uuid:job_id>/', views.get_report_job, name='get_report_job'),
+    path('reports/<uuid:job_id>/download/', views.download_report_job, name='download_report_job'),
 ]
\ No newline at end of file
@@ -1,31 +1,47 @@
-import csv
-import io
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+import json
+import os
 import numpy as np
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.units import inch
-from io import BytesIO
-from .models import Dataset, Equipment
-from .serializers import DatasetSerializer, EquipmentSerializer
+from .models import Dataset, DatasetSummary, Equipment, ReportJob, UploadSession
+from .pagination import keyset_page, parse_limit, set_next_link
+from .serializers import DatasetSerializer, ReportJobSerializer, UploadSessionSerializer
+from .summary import get_or_compute_summary, summary_payload
+from .wire import MEDIA_TYPE as COLUMNS_MEDIA_TYPE, ColumnarRenderer, encode_columns
+from .aggregation import aggregate_dataset, parse_fields, parse_metrics
+from .authentication import get_token_max_age, issue_token
+from .columnar import get_columns
+from .filters import EquipmentFilter
+from .reportcache import cached_report, open_report, report_key
+from .jobs import fail_stale_jobs, submit_report_job
+from .uploadhandlers import upload_digest
+from .uploads import (get_chunk_size, ingest_new_dataset, missing_chunks, received_chunks, submit_ingest,
+                      write_chunk)
+from .ingest import (REQUIRED_COLUMNS, accepted_extensions, compression_suffix, ingest_upload, missing_columns,
+                     stream_csv)
 
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+DATASET_PAGE_SIZE = 50
+EQUIPMENT_PAGE_SIZE = 500
+# Same fields, in the same order, as EquipmentSerializer
+EQUIPMENT_FIELDS = ('id', 'name', 'type', 'flowrate', 'pressure', 'temperature', 'dataset')
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -75,22 +91,18 @@ def login_view(request):
     if not username or not password:
         return Response({'error': 'Username and password required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Try to get user first
-    try:
-        user_obj = User.objects.get(username=username)
-        print(f"   User found: {user_obj.username}")
-    except User.DoesNotExist:
-        print(f"   User NOT found in database")
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
-    
     user = authenticate(username=username, password=password)
     print(f"   Authentication result: {user}")
     
     if user:
+        # Clients send this token back as "Authorization: Bearer <token>" so
+        # later requests skip the password hash entirely
         return Response({
             'success': True,
             'username': user.username,
-            'is_superuser': user.is_superuser
+            'is_superuser': user.is_superuser,
+            'token': issue_token(user),
+            'expires_in': get_token_max_age()
         })
     else:
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -105,404 +117,414 @@ def upload_csv(request):
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
     
     file = request.FILES['file']
-    if not file.name.endswith('.csv'):
-        return Response({'error': 'File must be CSV'}, status=status.HTTP_400_BAD_REQUEST)
+    if compression_suffix(file.name) is None:
+        return Response({'error': f"File must be CSV ({', '.join(accepted_extensions())})"},
+                        status=status.HTTP_400_BAD_REQUEST)
     
+    source_hash = upload_digest(request, 'file', file)
     try:
-        # Read CSV file
-        file_content = file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(file_content))
-        
-        required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-        
-        # Check if all required columns exist
-        if not all(col in csv_reader.fieldnames for col in required_columns):
-            return Response({'error': f'CSV must contain columns: {required_columns}'}, 
+        dataset, stats = ingest_new_dataset(request.user, file, source_hash)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if stats.get('duplicate'):
+        logger.info(f"   Duplicate of dataset {dataset.id}, skipping ingest")
+        return Response({'message': 'File already uploaded', 'dataset_id': dataset.id, **stats})
+    logger.info(f"   Ingested {stats['rows']} rows at {stats['rows_per_second']} rows/sec")
+    return Response({'message': 'File uploaded successfully', 'dataset_id': dataset.id, **stats})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def append_csv(request, dataset_id):
+    logger.info(f"📄 APPEND API CALL - User: {request.user.username}, Dataset: {dataset_id}")
+    if 'file' not in request.FILES:
+        return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    file = request.FILES['file']
+    if compression_suffix(file.name) is None:
+        return Response({'error': f"File must be CSV ({', '.join(accepted_extensions())})"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        csv_reader = stream_csv(file)
+        if missing_columns(csv_reader.fieldnames):
+            return Response({'error': f'CSV must contain columns: {REQUIRED_COLUMNS}'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Keep only last 5 datasets
-        user_datasets = Dataset.objects.filter(uploaded_by=request.user)
-        if user_datasets.count() >= 5:
-            oldest = user_datasets.last()
-            oldest.delete()
-        
-        # Create dataset
-        dataset = Dataset.objects.create(
-            name=file.name,
-            uploaded_by=request.user,
-            file_path=file.name
-        )
-        
-        # Create equipment records
-        for row in csv_reader:
-            Equipment.objects.create(
-                dataset=dataset,
-                name=row['Equipment Name'],
-                type=row['Type'],
-                flowrate=float(row['Flowrate']),
-                pressure=float(row['Pressure']),
-                temperature=float(row['Temperature'])
-            )
+        # A bad row rolls back every appended row. Concurrent appends to one
+        # dataset (and its column store) run one at a time because the
+        # production SQLite backend begins atomic() with BEGIN IMMEDIATE
+        # (api/backends/sqlite3/base.py): the second append waits at BEGIN,
+        # before it reads the dataset. SQLite ignores select_for_update();
+        # it takes the row lock on backends that have one
+        with transaction.atomic():
+            try:
+                dataset = Dataset.objects.select_for_update().get(id=dataset_id, uploaded_by=request.user)
+            except Dataset.DoesNotExist:
+                return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            # Only the new rows are parsed and inserted; the stored summary
+            # and column store are extended in place
+            stats = ingest_upload(dataset, file, csv_reader, append=True)
         
-        return Response({'message': 'File uploaded successfully', 'dataset_id': dataset.id})
+        logger.info(f"   Appended {stats['rows']} rows at {stats['rows_per_second']} rows/sec")
+        return Response({'message': 'Rows appended successfully', 'dataset_id': dataset.id, **stats})
     
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def upload_session_payload(request, session):
+    data = UploadSessionSerializer(session).data
+    data['chunk_size'] = get_chunk_size()
+    data['chunk_url'] = request.build_absolute_uri(f'/api/uploads/{session.pk}/chunks/')
+    data['status_url'] = request.build_absolute_uri(f'/api/uploads/{session.pk}/')
+    if session.status == UploadSession.OPEN:
+        data['received_chunks'] = received_chunks(session.pk)
+    return data
+
+def get_upload_session(request, upload_id):
+    try:
+        return UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return None
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_upload_session(request):
+    filename = str(request.data.get('filename', ''))
+    if compression_suffix(filename) is None:
+        return Response({'error': f"File must be CSV ({', '.join(accepted_extensions())})"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    session = UploadSession.objects.create(user=request.user, filename=filename[:255])
+    logger.info(f"📄 UPLOAD SESSION {session.pk} - User: {request.user.username}, File: {filename}")
+    return Response(upload_session_payload(request, session), status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def upload_session_status(request, upload_id):
+    session = get_upload_session(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(upload_session_payload(request, session))
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def put_upload_chunk(request, upload_id, index):
+    session = get_upload_session(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if session.status != UploadSession.OPEN:
+        return Response({'error': f'Upload is {session.status}'}, status=status.HTTP_409_CONFLICT)
+    # The body is read straight off the request stream, never parsed
+    try:
+        size = write_chunk(session.pk, index, request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return Response({'index': index, 'size': size})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload_session(request, upload_id):
+    session = get_upload_session(request, upload_id)
+    if session is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        total_chunks = int(request.data.get('total_chunks'))
+        if total_chunks < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return Response({'error': 'total_chunks must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if session.status != UploadSession.OPEN:
+        return Response({'error': f'Upload is {session.status}'}, status=status.HTTP_409_CONFLICT)
+    missing = missing_chunks(session.pk, total_chunks)
+    if missing:
+        return Response({'error': 'Chunks missing', 'missing_chunks': missing[:1000]},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    # Claim the session so a repeated finalize doesn't ingest it twice
+    claimed = UploadSession.objects.filter(pk=session.pk, status=UploadSession.OPEN).update(
+        status=UploadSession.INGESTING, total_chunks=total_chunks, updated_at=timezone.now())
+    if not claimed:
+        return Response({'error': 'Upload is already being finalized'}, status=status.HTTP_409_CONFLICT)
+    session_id = session.pk
+    transaction.on_commit(lambda: submit_ingest(session_id))
+    session.refresh_from_db()
+    return Response(upload_session_payload(request, session), status=status.HTTP_202_ACCEPTED)
+
+def equipment_count_subquery():
+    counts = (Equipment.objects.filter(dataset=OuterRef('pk')).order_by()
+              .values('dataset').annotate(total=Count('id')).values('total'))
+    return Subquery(counts, output_field=IntegerField())
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_datasets(request):
     print(f"\n📁 GET DATASETS API CALL - User: {request.user.username}")
     print(f"   Time: {datetime.now().strftime('%H:%M:%S')}")
     logger.info(f"📁 GET DATASETS API CALL - User: {request.user.username}")
-    datasets = Dataset.objects.filter(uploaded_by=request.user)
+    try:
+        limit = parse_limit(request.query_params.get('limit'), default=DATASET_PAGE_SIZE)
+        # One query for the whole page: counts come from the stored summaries
+        # (with a COUNT subquery only for datasets that predate them)
+        datasets, next_cursor = keyset_page(
+            Dataset.objects.filter(uploaded_by=request.user)
+                .only('id', 'name', 'uploaded_at')
+                .annotate(equipment_count=Coalesce('summary__count', equipment_count_subquery(),
+                                                   output_field=IntegerField())),
+            keys=('uploaded_at', 'id'),
+            cursor=request.query_params.get('cursor'),
+            limit=limit,
+            descending=True
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     serializer = DatasetSerializer(datasets, many=True)
-    return Response(serializer.data)
+    return set_next_link(Response(serializer.data), request, next_cursor)
+
+def parse_equipment_fields(value):
+    """Validate a ?fields= projection, defaulting to every serialized field"""
+    if not value:
+        return list(EQUIPMENT_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in EQUIPMENT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Unknown fields {unknown}; choose from {list(EQUIPMENT_FIELDS)}')
+    return fields
+
+def stream_equipment_json(queryset, fields, chunk_size):
+    """Yield a JSON array of row objects without materializing the result set"""
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    yield '['
+    first = True
+    buffer = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        buffer.append(encoder.encode(dict(zip(fields, row))))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']'
+
+def table_columns(queryset, fields):
+    """The requested fields as wire columns, read from the Equipment rows"""
+    rows = list(queryset.order_by('id').values_list(*fields))
+    data = {}
+    for index, field in enumerate(fields):
+        values = [row[index] for row in rows]
+        if field == 'type':
+            names, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+            data['type'] = (codes, names.tolist())
+        else:
+            data[field] = values
+    return data
+
+def encode_equipment_columns(dataset, fields, row_filter=None):
+    """Build the columnar wire payload, reading numbers from the column store"""
+    row_filter = row_filter or EquipmentFilter()
+    columns = get_columns(dataset)
+    mask = row_filter.mask(columns) if row_filter else None
+    row_fields = [f for f in ('id', 'name') if f in fields]
+    rows = []
+    if row_fields:
+        queryset = row_filter.apply(Equipment.objects.filter(dataset_id=dataset.id))
+        rows = list(queryset.order_by('id').values_list(*row_fields))
+        if len(rows) != (len(columns) if mask is None else int(mask.sum())):
+            # The store is out of step with the committed rows (an append is
+            # writing it); answer from the table and leave the store to the
+            # writer rather than rewriting it from a read
+            return encode_columns(table_columns(queryset, fields))
+    
+    def select(values):
+        return values if mask is None else values[mask]
+    
+    data = {}
+    for field in fields:
+        if field in row_fields:
+            index = row_fields.index(field)
+            values = [row[index] for row in rows]
+            data[field] = np.array(values, dtype=np.int64) if field == 'id' else values
+        elif field == 'type':
+            data['type'] = (select(columns.type_codes), columns.type_names)
+        elif field == 'dataset':
+            data['dataset'] = np.full(len(select(columns.type_codes)), dataset.id, dtype=np.int64)
+        else:
+            data[field] = select(getattr(columns, field))
+    return encode_columns(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, ColumnarRenderer])
 def get_equipment_data(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
-        equipment = dataset.equipment.all()
-        serializer = EquipmentSerializer(equipment, many=True)
-        return Response(serializer.data)
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        fields = parse_equipment_fields(request.query_params.get('fields'))
+        row_filter = EquipmentFilter.from_params(request.query_params)
+        equipment = row_filter.apply(Equipment.objects.filter(dataset_id=dataset.id)).order_by('id')
+        
+        # Binary columnar mode for clients that asked for it
+        if request.accepted_renderer.format == ColumnarRenderer.format:
+            return HttpResponse(encode_equipment_columns(dataset, fields, row_filter), content_type=COLUMNS_MEDIA_TYPE)
+        
+        # Paged mode: keyset on id, next page advertised in the Link header
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            limit = parse_limit(request.query_params.get('limit'), default=EQUIPMENT_PAGE_SIZE)
+            rows, next_cursor = keyset_page(equipment.values('id', *fields), keys=('id',),
+                                            cursor=request.query_params.get('cursor'), limit=limit)
+            if 'id' not in fields:
+                rows = [{f: row[f] for f in fields} for row in rows]
+            return set_next_link(Response(rows), request, next_cursor)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Full dataset: stream the JSON array from a chunked cursor
+    chunk_size = getattr(settings, 'EQUIPMENT_STREAM_CHUNK_SIZE', 2000)
+    return StreamingHttpResponse(stream_equipment_json(equipment, fields, chunk_size),
+                                 content_type='application/json')
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_summary(request, dataset_id):
+def get_aggregates(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
-        equipment = dataset.equipment.all()
-        
-        if not equipment:
-            return Response({'error': 'No equipment data found'})
-        
-        # Calculate summary statistics
-        flowrates = [e.flowrate for e in equipment]
-        pressures = [e.pressure for e in equipment]
-        temperatures = [e.temperature for e in equipment]
-        
-        type_counts = {}
-        for e in equipment:
-            type_counts[e.type] = type_counts.get(e.type, 0) + 1
-        
-        summary = {
-            'total_count': len(equipment),
-            'avg_flowrate': sum(flowrates) / len(flowrates),
-            'avg_pressure': sum(pressures) / len(pressures),
-            'avg_temperature': sum(temperatures) / len(temperatures),
-            'type_distribution': type_counts
-        }
-        
-        return Response(summary)
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
-
-def create_chart(data, chart_type, title, xlabel, ylabel, filename):
-    """Create various types of charts and return as BytesIO object"""
-    plt.figure(figsize=(12, 8))  # Increased figure size
-    plt.style.use('default')
     
-    if chart_type == 'bar':
-        bars = plt.bar(data['x'], data['y'], color=['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b', '#ef4444', '#10b981'])
-        # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45, ha='right')
-        # Add value labels on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height + max(data['y'])*0.01,
-                    f'{height:.1f}', ha='center', va='bottom', fontsize=10, fontweight='bold')
-    elif chart_type == 'line':
-        plt.plot(data['x'], data['y'], marker='o', linewidth=3, markersize=8, color='#60a5fa')
-        plt.xticks(rotation=45, ha='right')
-    elif chart_type == 'scatter':
-        plt.scatter(data['x'], data['y'], alpha=0.7, s=80, color='#60a5fa', edgecolors='white', linewidth=1)
-    elif chart_type == 'pie':
-        colors = ['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b']
-        # Create pie chart with better label positioning
-        wedges, texts, autotexts = plt.pie(data['y'], labels=data['x'], autopct='%1.1f%%', 
-                                          startangle=90, colors=colors[:len(data['x'])],
-                                          pctdistance=0.85, labeldistance=1.1,
-                                          textprops={'fontsize': 11, 'fontweight': 'bold'})
-        
-        # Improve label positioning to avoid overlap
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-            autotext.set_fontsize(10)
-        
-        # Add legend instead of labels for better readability
-        plt.legend(wedges, [f'{label} ({count})' for label, count in zip(data['x'], data['y'])],
-                  title="Equipment Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1),
-                  fontsize=10)
-        
-        # Remove labels from pie chart to reduce congestion
-        for text in texts:
-            text.set_text('')
-    
-    plt.title(title, fontsize=16, fontweight='bold', pad=20)
-    if chart_type != 'pie':
-        plt.xlabel(xlabel, fontsize=14, fontweight='600')
-        plt.ylabel(ylabel, fontsize=14, fontweight='600')
+    try:
+        group_by = request.query_params.get('group_by', 'type')
+        fields = parse_fields(request.query_params.get('fields'))
+        metrics = parse_metrics(request.query_params.get('metrics'))
+        groups = aggregate_dataset(dataset, group_by, fields, metrics)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    plt.grid(True, alpha=0.3, linestyle='--')
-    plt.tight_layout(pad=2.0)  # Increased padding
+    return Response({
+        'dataset_id': dataset.id,
+        'group_by': group_by,
+        'fields': fields,
+        'metrics': metrics,
+        'groups': groups,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_summary(request, dataset_id):
+    # Summaries are materialized at ingest time, so this is a single-row
+    # primary-key lookup regardless of dataset size
+    try:
+        summary = DatasetSummary.objects.get(pk=dataset_id, dataset__uploaded_by=request.user)
+    except DatasetSummary.DoesNotExist:
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+        except Dataset.DoesNotExist:
+            return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+        summary = get_or_compute_summary(dataset)
     
-    # Save to BytesIO
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
-    img_buffer.seek(0)
-    plt.close()
+    if not summary.count:
+        return Response({'error': 'No equipment data found'})
     
-    return img_buffer
+    return Response(summary_payload(summary))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def generate_pdf_report(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
-        equipment = dataset.equipment.all()
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="report_{dataset.name}.pdf"'
-        
-        # Create PDF document with better margins
-        doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=20,
-            textColor=colors.HexColor('#1e293b'),
-            alignment=1  # Center alignment
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=15,
-            spaceBefore=20,
-            textColor=colors.HexColor('#374151'),
-            borderWidth=1,
-            borderColor=colors.HexColor('#e5e7eb'),
-            borderPadding=10,
-            backColor=colors.HexColor('#f8fafc')
-        )
-        
-        # Title
-        story.append(Paragraph(f"Equipment Analysis Report: {dataset.name}", title_style))
-        story.append(Spacer(1, 12))
-        
-        if equipment:
-            # Calculate statistics
-            flowrates = [e.flowrate for e in equipment]
-            pressures = [e.pressure for e in equipment]
-            temperatures = [e.temperature for e in equipment]
-            
-            avg_flow = sum(flowrates) / len(flowrates)
-            avg_pressure = sum(pressures) / len(pressures)
-            avg_temp = sum(temperatures) / len(temperatures)
-            
-            # Equipment type distribution
-            type_counts = {}
-            for e in equipment:
-                type_counts[e.type] = type_counts.get(e.type, 0) + 1
-            
-            # Executive Summary
-            story.append(Paragraph("Executive Summary", heading_style))
-            summary_data = [
-                ['Metric', 'Value'],
-                ['Total Equipment', str(equipment.count())],
-                ['Average Flowrate', f"{avg_flow:.2f} L/min"],
-                ['Average Pressure', f"{avg_pressure:.2f} bar"],
-                ['Average Temperature', f"{avg_temp:.2f} °C"],
-                ['Equipment Types', str(len(type_counts))]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0'))
-            ]))
-            story.append(summary_table)
-            story.append(Spacer(1, 20))
-            
-            # Equipment Type Distribution Chart
-            story.append(Paragraph("Equipment Type Distribution", heading_style))
-            type_chart_data = {
-                'x': list(type_counts.keys()),
-                'y': list(type_counts.values())
-            }
-            type_chart = create_chart(type_chart_data, 'pie', 'Equipment Distribution by Type', '', '', 'type_dist')
-            story.append(Image(type_chart, width=7*inch, height=5*inch))
-            story.append(PageBreak())  # Start new page for parameter analysis
-            
-            # Parameter Analysis Charts
-            story.append(Paragraph("Parameter Analysis", heading_style))
-            
-            # Flowrate by Equipment Type
-            # Create shorter, more readable equipment names
-            equipment_list = list(equipment[:8])  # Reduced to 8 items for better readability
-            equipment_names = []
-            for e in equipment_list:
-                name = e.name
-                # If name is too long, use equipment type + index
-                if len(name) > 12:
-                    type_count = sum(1 for eq in equipment_list[:equipment_list.index(e)+1] if eq.type == e.type)
-                    equipment_names.append(f"{e.type}-{type_count}")
-                else:
-                    equipment_names.append(name)
-            
-            flowrate_chart_data = {
-                'x': equipment_names,
-                'y': [e.flowrate for e in equipment_list]
-            }
-            flowrate_chart = create_chart(flowrate_chart_data, 'bar', 'Flowrate by Equipment (Top 8)', 'Equipment', 'Flowrate (L/min)', 'flowrate')
-            story.append(Image(flowrate_chart, width=7*inch, height=5*inch))
-            story.append(Spacer(1, 25))
-            
-            # Pressure vs Temperature Scatter Plot
-            scatter_data = {
-                'x': pressures,
-                'y': temperatures
-            }
-            scatter_chart = create_chart(scatter_data, 'scatter', 'Pressure vs Temperature Correlation', 'Pressure (bar)', 'Temperature (°C)', 'scatter')
-            story.append(Image(scatter_chart, width=7*inch, height=5*inch))
-            story.append(Spacer(1, 25))
-            
-            # Add Parameter Comparison Chart
-            story.append(Paragraph("Parameter Comparison by Equipment Type", heading_style))
-            
-            # Group data by equipment type for comparison
-            type_avg_data = {}
-            for eq_type in type_counts.keys():
-                type_equipment = [e for e in equipment if e.type == eq_type]
-                if type_equipment:
-                    type_avg_data[eq_type] = {
-                        'flowrate': sum(e.flowrate for e in type_equipment) / len(type_equipment),
-                        'pressure': sum(e.pressure for e in type_equipment) / len(type_equipment),
-                        'temperature': sum(e.temperature for e in type_equipment) / len(type_equipment)
-                    }
-            
-            # Create comparison bar chart for average flowrates by type
-            if type_avg_data:
-                comparison_data = {
-                    'x': list(type_avg_data.keys()),
-                    'y': [data['flowrate'] for data in type_avg_data.values()]
-                }
-                comparison_chart = create_chart(comparison_data, 'bar', 'Average Flowrate by Equipment Type', 'Equipment Type', 'Average Flowrate (L/min)', 'comparison')
-                story.append(Image(comparison_chart, width=7*inch, height=4*inch))
-                story.append(PageBreak())  # Start new page for detailed data
-            
-            # Detailed Equipment Data Table
-            story.append(Paragraph("Detailed Equipment Data", heading_style))
-            table_data = [['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
-            
-            for e in equipment[:15]:  # Show first 15 items
-                table_data.append([
-                    e.name[:20] + '...' if len(e.name) > 20 else e.name,
-                    e.type,
-                    f"{e.flowrate:.1f}",
-                    f"{e.pressure:.1f}",
-                    f"{e.temperature:.1f}"
-                ])
-            
-            if equipment.count() > 15:
-                table_data.append(['...', '...', '...', '...', '...'])
-                table_data.append([f"Total: {equipment.count()} items", '', '', '', ''])
-            
-            equipment_table = Table(table_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-            equipment_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9)
-            ]))
-            story.append(equipment_table)
-            story.append(Spacer(1, 20))
-            
-            # Statistical Analysis
-            story.append(Paragraph("Statistical Analysis", heading_style))
-            
-            # Calculate additional statistics
-            flow_std = np.std(flowrates)
-            pressure_std = np.std(pressures)
-            temp_std = np.std(temperatures)
-            
-            stats_data = [
-                ['Parameter', 'Mean', 'Std Dev', 'Min', 'Max'],
-                ['Flowrate (L/min)', f"{avg_flow:.2f}", f"{flow_std:.2f}", f"{min(flowrates):.2f}", f"{max(flowrates):.2f}"],
-                ['Pressure (bar)', f"{avg_pressure:.2f}", f"{pressure_std:.2f}", f"{min(pressures):.2f}", f"{max(pressures):.2f}"],
-                ['Temperature (°C)', f"{avg_temp:.2f}", f"{temp_std:.2f}", f"{min(temperatures):.2f}", f"{max(temperatures):.2f}"]
-            ]
-            
-            stats_table = Table(stats_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-            stats_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9)
-            ]))
-            story.append(stats_table)
-            story.append(Spacer(1, 20))
-            
-            # Recommendations
-            story.append(Paragraph("Recommendations & Insights", heading_style))
-            recommendations = []
-            
-            # High temperature equipment
-            high_temp_equipment = [e for e in equipment if e.temperature > avg_temp + temp_std]
-            if high_temp_equipment:
-                recommendations.append(f"• {len(high_temp_equipment)} equipment items are operating at high temperatures (>{avg_temp + temp_std:.1f}°C). Consider reviewing cooling systems.")
-            
-            # High pressure equipment
-            high_pressure_equipment = [e for e in equipment if e.pressure > avg_pressure + pressure_std]
-            if high_pressure_equipment:
-                recommendations.append(f"• {len(high_pressure_equipment)} equipment items are operating at high pressures (>{avg_pressure + pressure_std:.1f} bar). Monitor for safety compliance.")
-            
-            # Equipment type recommendations
-            most_common_type = max(type_counts, key=type_counts.get)
-            recommendations.append(f"• {most_common_type} equipment represents {type_counts[most_common_type]/len(equipment)*100:.1f}% of your fleet. Consider standardization benefits.")
-            
-            recommendations.append("• Regular maintenance scheduling recommended based on operating parameters.")
-            recommendations.append("• Consider implementing real-time monitoring for critical equipment.")
-            
-            for rec in recommendations:
-                story.append(Paragraph(rec, styles['Normal']))
-                story.append(Spacer(1, 6))
-            
-        else:
-            story.append(Paragraph("No equipment data available for this dataset.", styles['Normal']))
-        
-        # Build PDF
-        doc.build(story)
-        return response
+        key = report_key(dataset)
+        # The key only changes with the data or the template, so it is a strong ETag
+        if etag_matches(request, key):
+            return not_modified(key)
+        report, key = open_report(dataset, key)
+        return report_file_response(report, dataset, key)
         
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        return Response({'error': f'Error generating report: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'Error generating report: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def etag_matches(request, key):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in etags or quote_etag(key) in etags
+
+def not_modified(key):
+    response = HttpResponseNotModified()
+    response['ETag'] = quote_etag(key)
+    return response
+
+def report_file_response(report, dataset, key):
+    response = FileResponse(report, as_attachment=True, filename=f'report_{dataset.name}.pdf',
+                            content_type='application/pdf')
+    response['ETag'] = quote_etag(key)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def report_job_payload(request, job):
+    data = ReportJobSerializer(job).data
+    data['status_url'] = request.build_absolute_uri(f'/api/reports/{job.pk}/')
+    if job.status == ReportJob.DONE:
+        data['download_url'] = request.build_absolute_uri(f'/api/reports/{job.pk}/download/')
+    return data
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_report_job(request):
+    try:
+        dataset = Dataset.objects.get(id=request.data.get('dataset_id'), uploaded_by=request.user)
+    except (Dataset.DoesNotExist, ValueError, TypeError):
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Repeated clicks join the job already queued for this dataset, unless
+    # that job was orphaned by a restart
+    fail_stale_jobs(ReportJob.objects.filter(dataset=dataset, requested_by=request.user))
+    job = ReportJob.objects.filter(dataset=dataset, requested_by=request.user,
+                                   status__in=ReportJob.ACTIVE_STATUSES).first()
+    if job is None:
+        cached = cached_report(report_key(dataset))
+        if cached:
+            job = ReportJob.objects.create(dataset=dataset, requested_by=request.user, status=ReportJob.DONE,
+                                           file_path=cached, finished_at=timezone.now())
+            return Response(report_job_payload(request, job), status=status.HTTP_202_ACCEPTED)
+        job = ReportJob.objects.create(dataset=dataset, requested_by=request.user)
+        job_id = job.pk
+        transaction.on_commit(lambda: submit_report_job(job_id))
+        logger.info(f"Report job {job_id} queued for dataset {dataset.id}")
+    
+    return Response(report_job_payload(request, job), status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_report_job(request, job_id):
+    try:
+        job = ReportJob.objects.get(id=job_id, requested_by=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status in ReportJob.ACTIVE_STATUSES and fail_stale_jobs(ReportJob.objects.filter(pk=job.pk)):
+        job.refresh_from_db()
+    return Response(report_job_payload(request, job))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_report_job(request, job_id):
+    try:
+        job = ReportJob.objects.select_related('dataset').get(id=job_id, requested_by=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != ReportJob.DONE:
+        return Response({'error': 'Report is not ready', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+    key = os.path.splitext(os.path.basename(job.file_path))[0]
+    if etag_matches(request, key):
+        return not_modified(key)
+    try:
+        report = open(job.file_path, 'rb')
+    except FileNotFoundError:
+        # Evicted from the report cache; the client can queue a new job
+        return Response({'error': 'Report file is no longer available'}, status=status.HTTP_410_GONE)
+    return report_file_response(report, job.dataset, key)
@@ -0,0 +1,132 @@
+"""Compact columnar wire format for equipment data.
+
+Served by /api/equipment/<id>/ when the client sends
+`Accept: application/vnd.chemora.columns` (or `?format=columns`):
+
+    bytes 0-7     magic b'CHMCOL01'
+    bytes 8-11    uint32 little-endian length H of the JSON header
+    bytes 12-     JSON header, space-padded so that 12 + H is a multiple of 8
+    12 + H -      body: column buffers, each starting on an 8-byte boundary
+
+The header is {"rows": n, "columns": [...]}; each column entry gives its
+`name`, NumPy `dtype` and the `offset`/`length` of its buffer relative to the
+start of the body:
+
+    id, dataset                     '<i8'
+    flowrate, pressure, temperature '<f8'
+    type                            '<i4' codes into the entry's `dictionary`
+    name                            '<i8' array of n + 1 offsets into a UTF-8
+                                    blob at `data_offset`/`data_length`
+
+Numeric buffers are written straight from the dataset's memory-mapped column
+store, and clients can wrap them with np.frombuffer without copying.
+"""
+import json
+import struct
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+MAGIC = b'CHMCOL01'
+MEDIA_TYPE = 'application/vnd.chemora.columns'
+
+
+class ColumnarRenderer(BaseRenderer):
+    """Content-negotiation hook for the columnar format.
+
+    Views build the payload with encode_columns() themselves; anything else
+    (e.g. an error dict) is rendered as JSON and labelled application/json.
+    """
+    media_type = MEDIA_TYPE
+    format = 'columns'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray)):
+            return data
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+def _pad(size):
+    return -size % 8
+
+
+def encode_columns(columns):
+    """Encode an ordered mapping of column name -> values into the wire format.
+
+    Values are NumPy arrays, except `type` which is a (codes, dictionary)
+    pair and `name` which is a sequence of str.
+    """
+    entries = []
+    buffers = []
+    offset = 0
+    rows = None
+
+    def add_buffer(data):
+        nonlocal offset
+        start = offset
+        buffers.append(data)
+        padding = _pad(len(data))
+        if padding:
+            buffers.append(b'\0' * padding)
+        offset += len(data) + padding
+        return start, len(data)
+
+    for name, values in columns.items():
+        if name == 'name':
+            encoded = [value.encode('utf-8') for value in values]
+            offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            entry = {'name': name, 'dtype': '<i8', 'encoding': 'utf8-offsets'}
+            entry['offset'], entry['length'] = add_buffer(memoryview(offsets).cast('B'))
+            entry['data_offset'], entry['data_length'] = add_buffer(b''.join(encoded))
+            count = len(encoded)
+        elif name == 'type':
+            codes, dictionary = values
+            array = np.ascontiguousarray(codes, dtype='<i4')
+            entry = {'name': name, 'dtype': '<i4', 'dictionary': list(dictionary)}
+            entry['offset'], entry['length'] = add_buffer(memoryview(array).cast('B'))
+            count = len(array)
+        else:
+            dtype = '<i8' if name in ('id', 'dataset') else '<f8'
+            array = np.ascontiguousarray(values, dtype=dtype)
+            entry = {'name': name, 'dtype': dtype}
+            entry['offset'], entry['length'] = add_buffer(memoryview(array).cast('B'))
+            count = len(array)
+        if rows is None:
+            rows = count
+        elif rows != count:
+            raise ValueError(f'Column {name} has {count} rows, expected {rows}')
+        entries.append(entry)
+
+    header = json.dumps({'rows': rows or 0, 'columns': entries}, separators=(',', ':')).encode('utf-8')
+    header += b' ' * _pad(len(MAGIC) + 4 + len(header))
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header, *buffers])
+
+
+def decode_columns(payload):
+    """Decode a wire-format payload into {column: array}; `type` and `name` are decoded to str"""
+    view = memoryview(payload)
+    if bytes(view[:8]) != MAGIC:
+        raise ValueError('Not a columnar equipment payload')
+    (header_length,) = struct.unpack_from('<I', view, 8)
+    header = json.loads(bytes(view[12:12 + header_length]))
+    body = 12 + header_length
+    rows = header['rows']
+    result = {}
+    for entry in header['columns']:
+        start = body + entry['offset']
+        array = np.frombuffer(view[start:start + entry['length']], dtype=entry['dtype'])
+        if entry['name'] == 'type':
+            result['type'] = np.asarray(entry['dictionary'], dtype=str)[array] if rows else np.array([], dtype=str)
+        elif entry.get('encoding') == 'utf8-offsets':
+            data_start = body + entry['data_offset']
+            blob = bytes(view[data_start:data_start + entry['data_length']])
+            bounds = array.tolist()
+            result[entry['name']] = [blob[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(rows)]
+        else:
+            result[entry['name']] = array
+    return result
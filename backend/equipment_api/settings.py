@@ -47,6 +47,21 @@ TEMPLATES = [
     },
 ]
 
+# The 'production' SQLite profile (the default; set SQLITE_PROFILE=default to
+# turn it off) enables WAL so readers are not blocked while an upload writes,
+# makes writers queue for the lock for up to busy_timeout ms instead of
+# failing, and keeps connections open between requests. See
+# api/backends/sqlite3 and `manage.py bench_sqlite`.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '10000')),
+    'cache_size': -64 * 1024,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -54,8 +69,17 @@ DATABASES = {
     }
 }
 
+if SQLITE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'api.backends.sqlite3',
+        'OPTIONS': {'pragmas': SQLITE_PRAGMAS, 'transaction_mode': 'IMMEDIATE'},
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -63,6 +87,29 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Lifetime in seconds of the signed tokens issued by /api/login/
+API_TOKEN_MAX_AGE = int(os.environ.get('API_TOKEN_MAX_AGE', str(12 * 60 * 60)))
+
+# Rows per bulk_create batch when ingesting uploaded CSV files
+CSV_INGEST_BATCH_SIZE = int(os.environ.get('CSV_INGEST_BATCH_SIZE', '5000'))
+
+# Uploads are hashed as they stream in (see api/uploadhandlers.py) so a file
+# the user has already uploaded resolves to the existing dataset
+FILE_UPLOAD_HANDLERS = [
+    'api.uploadhandlers.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Uploads spooled to disk above this size are parsed across a process pool
+# in line-aligned byte ranges (workers default to the CPU count)
+CSV_PARALLEL_MIN_BYTES = int(os.environ.get('CSV_PARALLEL_MIN_BYTES', str(64 * 1024 * 1024)))
+CSV_PARALLEL_CHUNK_BYTES = int(os.environ.get('CSV_PARALLEL_CHUNK_BYTES', str(16 * 1024 * 1024)))
+CSV_PARALLEL_WORKERS = int(os.environ.get('CSV_PARALLEL_WORKERS', '0')) or None
+
+# Rows fetched per cursor round-trip when streaming /api/equipment/<id>/
+EQUIPMENT_STREAM_CHUNK_SIZE = 2000
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
@@ -76,6 +123,52 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Memory-mapped per-dataset column files (see api/columnar.py)
+COLUMN_STORE_ROOT = os.path.join(MEDIA_ROOT, 'columns')
+
+# PDF reports requested through /api/reports/ are rendered by a local pool of
+# REPORT_WORKERS processes. 0 renders them in-process as soon as the job is
+# committed.
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+# Jobs still pending or running after this many seconds are assumed lost
+# (e.g. across a restart) and marked failed so new requests start afresh
+REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', '600'))
+
+# Processes rendering one report's charts concurrently (unset: CPU count, at
+# most 4; 1 renders them one after another)
+REPORT_CHART_WORKERS = int(os.environ.get('REPORT_CHART_WORKERS', '0')) or None
+
+# 'vector' draws report charts as native PDF graphics, falling back to PNGs at
+# REPORT_CHART_DPI for charts it can't draw compactly; 'raster' always uses PNGs
+REPORT_CHART_MODE = os.environ.get('REPORT_CHART_MODE', 'vector')
+REPORT_CHART_DPI = int(os.environ.get('REPORT_CHART_DPI', '300'))
+
+# Rendered reports, keyed by dataset content and template version and evicted
+# least-recently-used first above REPORT_CACHE_MAX_BYTES (see api/reportcache.py)
+REPORT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'report_cache')
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Resumable chunked uploads through /api/uploads/ (see api/uploads.py): chunks
+# are spooled under UPLOAD_SESSION_DIR, clients are told to send
+# UPLOAD_CHUNK_SIZE bytes per chunk, and sessions idle (no chunk or status
+# change) for UPLOAD_SESSION_MAX_AGE_HOURS are removed by
+# `manage.py purge_datasets`.
+# Finalized uploads are ingested on a background thread unless
+# UPLOAD_INGEST_ASYNC is False.
+UPLOAD_SESSION_DIR = os.path.join(MEDIA_ROOT, 'upload_sessions')
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_MAX_BYTES = int(os.environ.get('UPLOAD_CHUNK_MAX_BYTES', str(64 * 1024 * 1024)))
+UPLOAD_SESSION_MAX_AGE_HOURS = int(os.environ.get('UPLOAD_SESSION_MAX_AGE_HOURS', '24'))
+UPLOAD_INGEST_ASYNC = os.environ.get('UPLOAD_INGEST_ASYNC', 'True') == 'True'
+
+# Per-user dataset retention (see api/retention.py); 0 disables a limit. Each
+# upload queues a background sweep of its user's datasets once it commits;
+# DATASET_RETENTION_ASYNC=False sweeps inline instead.
+DATASET_RETENTION_MAX_PER_USER = int(os.environ.get('DATASET_RETENTION_MAX_PER_USER', '5'))
+DATASET_RETENTION_MAX_AGE_DAYS = int(os.environ.get('DATASET_RETENTION_MAX_AGE_DAYS', '0'))
+DATASET_RETENTION_MAX_ROWS = int(os.environ.get('DATASET_RETENTION_MAX_ROWS', '0'))
+DATASET_RETENTION_ASYNC = os.environ.get('DATASET_RETENTION_ASYNC', 'True') == 'True'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
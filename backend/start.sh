@@ -1,4 +1,5 @@
 #!/usr/bin/env bash
 # Start script for Render
 
-gunicorn equipment_api.wsgi:application --bind 0.0.0.0:$PORT
\ No newline at end of file
+# Report rendering no longer touches pyplot's global state, so workers can serve requests from several threads
+gunicorn equipment_api.wsgi:application --bind 0.0.0.0:$PORT --worker-class gthread --threads ${GUNICORN_THREADS:-4}
\ No newline at end of file
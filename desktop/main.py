@@ -1,6 +1,12 @@
+import os
 import sys
+import json
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import base64
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -9,6 +15,174 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
+COLUMNS_MEDIA_TYPE = 'application/vnd.chemora.columns'
+EQUIPMENT_COLUMNS = 'name,type,flowrate,pressure,temperature'
+REPORT_POLL_INTERVAL_MS = 1000
+REPORT_TIMEOUT_SECONDS = 300
+# Above this many points the scatter becomes a hexbin density plot and the
+# temperature line a min/max envelope, so drawing cost tracks pixels, not rows
+LARGE_N_POINTS = 20000
+ENVELOPE_BUCKETS = 1000
+
+# Uploads go through the backend's resumable chunked protocol (/api/uploads/),
+# UPLOAD_WORKERS chunks at a time; failed chunks are retried and, after a
+# dropped connection, only the chunks the server is missing are resent
+UPLOAD_WORKERS = 4
+UPLOAD_CHUNK_RETRIES = 3
+UPLOAD_TIMEOUT_SECONDS = 3600
+
+def decode_columns(payload):
+    """Decode the backend's columnar equipment payload (see backend/api/wire.py)
+    into a dict of NumPy arrays; 'type' and 'name' come back as strings"""
+    view = memoryview(payload)
+    if bytes(view[:8]) != b'CHMCOL01':
+        raise ValueError('Not a columnar equipment payload')
+    (header_length,) = struct.unpack_from('<I', view, 8)
+    header = json.loads(bytes(view[12:12 + header_length]))
+    body = 12 + header_length
+    rows = header['rows']
+    columns = {}
+    for entry in header['columns']:
+        start = body + entry['offset']
+        array = np.frombuffer(view[start:start + entry['length']], dtype=entry['dtype'])
+        if entry['name'] == 'type':
+            columns['type'] = np.asarray(entry['dictionary'], dtype=str)[array] if rows else np.array([], dtype=str)
+        elif entry.get('encoding') == 'utf8-offsets':
+            data_start = body + entry['data_offset']
+            blob = bytes(view[data_start:data_start + entry['data_length']])
+            bounds = array.tolist()
+            columns[entry['name']] = [blob[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(rows)]
+        else:
+            columns[entry['name']] = array
+    return columns
+
+def minmax_envelope(values, buckets=ENVELOPE_BUCKETS):
+    """Split `values` into `buckets` runs and return each run's centre index, min and max"""
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.linspace(0, len(values), min(buckets, len(values)) + 1).astype(np.int64)[:-1]
+    ends = np.append(starts[1:], len(values))
+    return (starts + ends - 1) / 2, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+def response_error(response):
+    try:
+        return response.json().get('error', f'HTTP {response.status_code}')
+    except ValueError:
+        return f'HTTP {response.status_code}'
+
+def file_chunks(path, chunk_size, compress=False):
+    """Yield the file's bytes in `chunk_size` pieces (at least one), gzip-compressed
+    on the fly if `compress`. Compression is deterministic, so chunk i is the same
+    bytes every time the file is read."""
+    with open(path, 'rb') as f:
+        if not compress:
+            data = f.read(chunk_size)
+            yield data
+            while data:
+                data = f.read(chunk_size)
+                if data:
+                    yield data
+            return
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container, mtime 0
+        pending = bytearray()
+        for data in iter(lambda: f.read(1024 * 1024), b''):
+            pending += compressor.compress(data)
+            while len(pending) >= chunk_size:
+                yield bytes(pending[:chunk_size])
+                del pending[:chunk_size]
+        pending += compressor.flush()
+        while pending:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+
+def send_chunks(session, headers, chunks, wanted=None, progress=None):
+    """PUT `chunks` (only the indices in `wanted`, if given) UPLOAD_WORKERS at a
+    time, reading ahead no further than the transfers in flight. Returns the
+    number of chunks in the file."""
+    chunk_headers = {**headers, 'Content-Type': 'application/octet-stream'}
+
+    def send(index, data):
+        for attempt in range(UPLOAD_CHUNK_RETRIES):
+            try:
+                reply = requests.put(f"{session['chunk_url']}{index}/", data=data, headers=chunk_headers, timeout=120)
+                if reply.status_code == 200:
+                    return True
+            except requests.RequestException:
+                pass
+            time.sleep(2 ** attempt)
+        return False
+
+    total = sent = 0
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        for index, data in enumerate(chunks):
+            total += 1
+            if wanted is not None and index not in wanted:
+                continue
+            in_flight.append(pool.submit(send, index, data))
+            while len(in_flight) >= UPLOAD_WORKERS * 2 or (in_flight and in_flight[0].done()):
+                sent += in_flight.popleft().result()
+                if progress:
+                    progress(sent)
+        while in_flight:
+            sent += in_flight.popleft().result()
+            if progress:
+                progress(sent)
+    return total
+
+def upload_in_chunks(api_base, headers, path, progress=None, compress=False):
+    """Send the file at `path` as a chunked upload, gzip-compressing it on the
+    fly if `compress`, and return the finished upload session (its 'dataset_id'
+    once ingested). `progress(message)` is called from the calling thread."""
+    filename = os.path.basename(path) + ('.gz' if compress else '')
+    response = requests.post(f"{api_base}/uploads/", json={'filename': filename}, headers=headers, timeout=10)
+    if response.status_code != 201:
+        raise RuntimeError(response_error(response))
+    session = response.json()
+    chunk_size = session['chunk_size']
+
+    def report(sent):
+        if progress:
+            progress(f"Uploading file... {sent} chunks sent")
+
+    total = send_chunks(session, headers, file_chunks(path, chunk_size, compress), progress=report)
+    # One more status check than resends, so the last resend is verified too
+    for attempt in range(UPLOAD_CHUNK_RETRIES + 1):
+        # Ask the server which chunks it actually holds and resend the rest
+        status = requests.get(session['status_url'], headers=headers, timeout=10).json()
+        missing = set(range(total)) - set(status.get('received_chunks', []))
+        if not missing:
+            break
+        if attempt == UPLOAD_CHUNK_RETRIES:
+            raise RuntimeError(f'{len(missing)} of {total} chunks could not be uploaded')
+        send_chunks(session, headers, file_chunks(path, chunk_size, compress), wanted=missing, progress=report)
+
+    response = requests.post(f"{api_base}/uploads/{session['upload_id']}/finalize/",
+                             json={'total_chunks': total}, headers=headers, timeout=30)
+    if response.status_code != 202:
+        raise RuntimeError(response_error(response))
+    deadline = time.monotonic() + UPLOAD_TIMEOUT_SECONDS
+    session = response.json()
+    while session['status'] not in ('done', 'failed'):
+        if time.monotonic() > deadline:
+            raise RuntimeError('Timed out waiting for the server to ingest the file')
+        if progress:
+            progress("Processing file on the server...")
+        time.sleep(1)
+        session = requests.get(session['status_url'], headers=headers, timeout=10).json()
+    if session['status'] == 'failed':
+        raise RuntimeError(session['error'])
+    return session
+
+def rows_to_columns(rows):
+    """Convert the JSON list-of-rows response into the same column layout"""
+    return {
+        'name': [row['name'] for row in rows],
+        'type': np.array([row['type'] for row in rows], dtype=str),
+        'flowrate': np.array([row['flowrate'] for row in rows], dtype=float),
+        'pressure': np.array([row['pressure'] for row in rows], dtype=float),
+        'temperature': np.array([row['temperature'] for row in rows], dtype=float),
+    }
+
 class SignupDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -234,27 +408,38 @@ class ChartsWidget(QWidget):
                 autotext.set_fontsize(11)
         
         elif chart_type == 'scatter':
-            x_data, y_data = data
-            scatter = ax.scatter(x_data, y_data, c='#4facfe', alpha=0.7, s=80, edgecolors='white', linewidth=2)
+            x_data, y_data = np.asarray(data[0], dtype=float), np.asarray(data[1], dtype=float)
+            if len(x_data) > LARGE_N_POINTS:
+                density = ax.hexbin(x_data, y_data, gridsize=60, cmap='Blues', mincnt=1, bins='log')
+                fig.colorbar(density, ax=ax, label='Equipment count')
+            else:
+                scatter = ax.scatter(x_data, y_data, c='#4facfe', alpha=0.7, s=80, edgecolors='white', linewidth=2)
             ax.set_title(title, fontsize=18, fontweight='bold', pad=30)
             ax.set_xlabel(labels[0] if labels else 'X', fontsize=14)
             ax.set_ylabel(labels[1] if labels else 'Y', fontsize=14)
             ax.grid(True, alpha=0.3)
             
-            # Add trend line
+            # Add trend line (a straight line only needs its end points)
             if len(x_data) > 1:
                 z = np.polyfit(x_data, y_data, 1)
                 p = np.poly1d(z)
-                ax.plot(x_data, p(x_data), "--", color='#ff6b6b', alpha=0.8, linewidth=3)
+                ends = np.array([x_data.min(), x_data.max()])
+                ax.plot(ends, p(ends), "--", color='#ff6b6b', alpha=0.8, linewidth=3)
         
         elif chart_type == 'line':
-            ax.plot(range(len(data)), data, marker='o', linewidth=4, markersize=10, 
-                   color='#4facfe', markerfacecolor='#00f2fe', markeredgecolor='white', markeredgewidth=2)
+            if len(data) > LARGE_N_POINTS:
+                index, low, high = minmax_envelope(data)
+                ax.fill_between(index, low, high, alpha=0.5, color='#4facfe', linewidth=0)
+                ax.plot(index, high, linewidth=1, color='#4facfe')
+                ax.plot(index, low, linewidth=1, color='#4facfe')
+            else:
+                ax.plot(range(len(data)), data, marker='o', linewidth=4, markersize=10, 
+                       color='#4facfe', markerfacecolor='#00f2fe', markeredgecolor='white', markeredgewidth=2)
+                ax.fill_between(range(len(data)), data, alpha=0.3, color='#4facfe')
             ax.set_title(title, fontsize=18, fontweight='bold', pad=30)
             ax.set_xlabel('Equipment Index', fontsize=14)
             ax.set_ylabel('Temperature (°C)', fontsize=14)
             ax.grid(True, alpha=0.3)
-            ax.fill_between(range(len(data)), data, alpha=0.3, color='#4facfe')
         
         # Style the plot
         ax.spines['top'].set_visible(False)
@@ -331,13 +516,21 @@ class ChartsWidget(QWidget):
         
         return card
     
+    @staticmethod
+    def parameter_stats(summary, param, values):
+        """Min/max/mean for a parameter, from the summary when the server provides them"""
+        stats = summary.get(param)
+        if stats:
+            return stats
+        return {'min': values.min(), 'max': values.max(), 'mean': values.mean()}
+    
     def plot_data(self, data, summary):
         """Plot all charts with the provided data"""
         # Clear existing charts
         for i in reversed(range(self.charts_layout.count())): 
             self.charts_layout.itemAt(i).widget().setParent(None)
         
-        if not data or not summary:
+        if not data or not len(data['flowrate']) or not summary:
             no_data_label = QLabel("📈 No data available for visualization")
             no_data_label.setAlignment(Qt.AlignCenter)
             no_data_label.setStyleSheet("""
@@ -370,40 +563,45 @@ class ChartsWidget(QWidget):
             self.charts_layout.addWidget(pie_chart)
         
         # 3. Flowrate vs Pressure Scatter Plot
-        flowrates = [item['flowrate'] for item in data]
-        pressures = [item['pressure'] for item in data]
+        flowrates = data['flowrate']
+        pressures = data['pressure']
         
         scatter_chart = self.create_matplotlib_chart('scatter', 'Flowrate vs Pressure Correlation', 
                                                     (flowrates, pressures), ['Flowrate', 'Pressure'])
         self.charts_layout.addWidget(scatter_chart)
         
         # 4. Temperature Trend Line Chart
-        temperatures = [item['temperature'] for item in data]
+        temperatures = data['temperature']
         temp_chart = self.create_matplotlib_chart('line', 'Temperature Distribution Across Equipment', 
                                                  temperatures)
         self.charts_layout.addWidget(temp_chart)
         
-        # 5. Statistics Cards
+        # 5. Statistics Cards - min/max/mean come precomputed from the
+        # backend's vectorized stats engine via the summary endpoint
+        temp = self.parameter_stats(summary, 'temperature', temperatures)
+        flow = self.parameter_stats(summary, 'flowrate', flowrates)
+        pressure = self.parameter_stats(summary, 'pressure', pressures)
+        
         temp_stats = {
-            f"📈 Total Equipment": f"{len(data)} items",
-            f"🌡️ Min Temperature": f"{min(temperatures):.2f}°C",
-            f"🌡️ Max Temperature": f"{max(temperatures):.2f}°C",
-            f"🌡️ Avg Temperature": f"{sum(temperatures)/len(temperatures):.2f}°C",
-            f"📉 Temperature Range": f"{max(temperatures) - min(temperatures):.2f}°C"
+            f"📈 Total Equipment": f"{summary.get('total_count', len(temperatures))} items",
+            f"🌡️ Min Temperature": f"{temp['min']:.2f}°C",
+            f"🌡️ Max Temperature": f"{temp['max']:.2f}°C",
+            f"🌡️ Avg Temperature": f"{temp['mean']:.2f}°C",
+            f"📉 Temperature Range": f"{temp['max'] - temp['min']:.2f}°C"
         }
         
         flow_stats = {
-            f"💧 Min Flowrate": f"{min(flowrates):.2f}",
-            f"💧 Max Flowrate": f"{max(flowrates):.2f}",
-            f"💧 Avg Flowrate": f"{sum(flowrates)/len(flowrates):.2f}",
-            f"📉 Flowrate Range": f"{max(flowrates) - min(flowrates):.2f}"
+            f"💧 Min Flowrate": f"{flow['min']:.2f}",
+            f"💧 Max Flowrate": f"{flow['max']:.2f}",
+            f"💧 Avg Flowrate": f"{flow['mean']:.2f}",
+            f"📉 Flowrate Range": f"{flow['max'] - flow['min']:.2f}"
         }
         
         pressure_stats = {
-            f"⚙️ Min Pressure": f"{min(pressures):.2f}",
-            f"⚙️ Max Pressure": f"{max(pressures):.2f}",
-            f"⚙️ Avg Pressure": f"{sum(pressures)/len(pressures):.2f}",
-            f"📉 Pressure Range": f"{max(pressures) - min(pressures):.2f}"
+            f"⚙️ Min Pressure": f"{pressure['min']:.2f}",
+            f"⚙️ Max Pressure": f"{pressure['max']:.2f}",
+            f"⚙️ Avg Pressure": f"{pressure['mean']:.2f}",
+            f"📉 Pressure Range": f"{pressure['max'] - pressure['min']:.2f}"
         }
         
         # Create horizontal layout for stats cards with proper spacing
@@ -537,14 +735,14 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Error", "Please enter valid credentials!")
                 return False
             
-            # Create Basic Auth header for any user
-            auth_string = base64.b64encode(f"{username}:{password}".encode()).decode()
-            self.auth_header = {"Authorization": f"Basic {auth_string}"}
-            
-            # Verify credentials with backend
+            # Exchange the credentials once for a signed token; every later
+            # request sends the token instead of re-checking the password
             try:
-                response = requests.get(f"{self.api_base}/datasets/", headers=self.auth_header, timeout=5)
+                response = requests.post(f"{self.api_base}/login/",
+                                         json={"username": username, "password": password}, timeout=5)
                 if response.status_code == 200:
+                    token = response.json()['token']
+                    self.auth_header = {"Authorization": f"Bearer {token}"}
                     QMessageBox.information(self, "Success", f"Welcome {username}!")
                     return True
                 elif response.status_code == 401:
@@ -590,7 +788,11 @@ class MainWindow(QMainWindow):
         select_file_btn.clicked.connect(self.select_file)
         upload_btn.clicked.connect(self.upload_file)
         
+        self.compress_checkbox = QCheckBox("Compress while uploading (gzip)")
+        self.compress_checkbox.setChecked(True)
+        
         upload_layout.addLayout(file_layout)
+        upload_layout.addWidget(self.compress_checkbox)
         upload_layout.addWidget(upload_btn)
         upload_group.setLayout(upload_layout)
         
@@ -663,7 +865,8 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage("Ready - Upload a CSV file to get started")
     
     def select_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select CSV File", "", "CSV Files (*.csv)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select CSV File", "",
+                                                   "CSV Files (*.csv *.csv.gz *.csv.bz2 *.csv.xz)")
         if file_path:
             self.selected_file = file_path
             filename = file_path.split('\\')[-1]
@@ -677,22 +880,19 @@ class MainWindow(QMainWindow):
         
         self.statusBar().showMessage("Uploading file...")
         
+        def show_progress(message):
+            self.statusBar().showMessage(message)
+            QApplication.processEvents()
+        
+        # Files that are already compressed are sent as they are
+        compress = self.compress_checkbox.isChecked() and self.selected_file.endswith('.csv')
         try:
-            with open(self.selected_file, 'rb') as f:
-                files = {'file': f}
-                response = requests.post(f"{self.api_base}/upload/", 
-                                       files=files, headers=self.auth_header, timeout=10)
-            
-            if response.status_code == 200:
-                QMessageBox.information(self, "Success", "File uploaded successfully!")
-                self.load_datasets()
-                self.selected_file = None
-                self.file_path_label.setText("No file selected")
-                self.statusBar().showMessage("File uploaded successfully")
-            else:
-                error_msg = response.json().get('error', 'Unknown error') if response.content else 'Server error'
-                QMessageBox.warning(self, "Error", f"Upload failed: {error_msg}")
-                self.statusBar().showMessage("Upload failed")
+            upload_in_chunks(self.api_base, self.auth_header, self.selected_file, show_progress, compress)
+            QMessageBox.information(self, "Success", "File uploaded successfully!")
+            self.load_datasets()
+            self.selected_file = None
+            self.file_path_label.setText("No file selected")
+            self.statusBar().showMessage("File uploaded successfully")
         
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Upload failed: {str(e)}")
@@ -731,13 +931,20 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage("Loading equipment data...")
         
         try:
+            # Ask for the compact binary columnar format; it decodes straight
+            # into NumPy arrays instead of a list of per-row dicts
             equipment_response = requests.get(f"{self.api_base}/equipment/{dataset_id}/", 
-                                            headers=self.auth_header, timeout=10)
+                                            params={"fields": EQUIPMENT_COLUMNS},
+                                            headers={**self.auth_header, "Accept": COLUMNS_MEDIA_TYPE},
+                                            timeout=10)
             summary_response = requests.get(f"{self.api_base}/summary/{dataset_id}/", 
                                           headers=self.auth_header, timeout=10)
             
             if equipment_response.status_code == 200 and summary_response.status_code == 200:
-                equipment_data = equipment_response.json()
+                if equipment_response.headers.get('Content-Type', '').startswith(COLUMNS_MEDIA_TYPE):
+                    equipment_data = decode_columns(equipment_response.content)
+                else:
+                    equipment_data = rows_to_columns(equipment_response.json())
                 summary_data = summary_response.json()
                 
                 type_dist = ", ".join([f"{k}: {v}" for k, v in summary_data['type_distribution'].items()])
@@ -758,7 +965,7 @@ Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
                 
                 self.pdf_btn.setEnabled(True)
                 
-                self.statusBar().showMessage(f"Loaded {len(equipment_data)} equipment records")
+                self.statusBar().showMessage(f"Loaded {len(equipment_data['name'])} equipment records")
             else:
                 QMessageBox.warning(self, "Error", "Failed to load equipment data")
                 self.statusBar().showMessage("Failed to load data")
@@ -768,19 +975,21 @@ Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
             self.statusBar().showMessage("Error loading data")
     
     def update_table(self, data):
-        if not data:
+        if not data or not data['name']:
             return
         
-        self.data_table.setRowCount(len(data))
+        self.data_table.setRowCount(len(data['name']))
         self.data_table.setColumnCount(5)
         self.data_table.setHorizontalHeaderLabels(['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
         
-        for row, item in enumerate(data):
-            self.data_table.setItem(row, 0, QTableWidgetItem(str(item['name'])))
-            self.data_table.setItem(row, 1, QTableWidgetItem(str(item['type'])))
-            self.data_table.setItem(row, 2, QTableWidgetItem(f"{item['flowrate']:.2f}"))
-            self.data_table.setItem(row, 3, QTableWidgetItem(f"{item['pressure']:.2f}"))
-            self.data_table.setItem(row, 4, QTableWidgetItem(f"{item['temperature']:.2f}"))
+        rows = zip(data['name'], data['type'].tolist(), data['flowrate'].tolist(),
+                   data['pressure'].tolist(), data['temperature'].tolist())
+        for row, (name, eq_type, flowrate, pressure, temperature) in enumerate(rows):
+            self.data_table.setItem(row, 0, QTableWidgetItem(str(name)))
+            self.data_table.setItem(row, 1, QTableWidgetItem(str(eq_type)))
+            self.data_table.setItem(row, 2, QTableWidgetItem(f"{flowrate:.2f}"))
+            self.data_table.setItem(row, 3, QTableWidgetItem(f"{pressure:.2f}"))
+            self.data_table.setItem(row, 4, QTableWidgetItem(f"{temperature:.2f}"))
         
         self.data_table.resizeColumnsToContents()
         self.data_table.setAlternatingRowColors(True)
@@ -792,18 +1001,15 @@ Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
         self.statusBar().showMessage("Generating PDF report...")
         
         try:
-            response = requests.get(f"{self.api_base}/report/{self.selected_dataset_id}/", 
-                                  headers=self.auth_header, timeout=10)
+            # Reports render in the background; queue a job and poll it
+            response = requests.post(f"{self.api_base}/reports/", json={"dataset_id": self.selected_dataset_id},
+                                     headers=self.auth_header, timeout=10)
             
-            if response.status_code == 200:
-                file_path, _ = QFileDialog.getSaveFileName(self, "Save PDF Report", 
-                                                         f"equipment_report_{self.selected_dataset_id}.pdf", 
-                                                         "PDF Files (*.pdf)")
-                if file_path:
-                    with open(file_path, 'wb') as f:
-                        f.write(response.content)
-                    QMessageBox.information(self, "Success", f"PDF report saved successfully!\\n\\nSaved to: {file_path}")
-                    self.statusBar().showMessage("PDF report saved")
+            if response.status_code == 202:
+                self.report_job = response.json()
+                self.report_deadline = time.monotonic() + REPORT_TIMEOUT_SECONDS
+                self.pdf_btn.setEnabled(False)
+                QTimer.singleShot(REPORT_POLL_INTERVAL_MS, self.poll_report_job)
             else:
                 QMessageBox.warning(self, "Error", "Failed to generate PDF report")
                 self.statusBar().showMessage("PDF generation failed")
@@ -811,6 +1017,44 @@ Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to download PDF: {str(e)}")
             self.statusBar().showMessage("PDF download failed")
+    
+    def poll_report_job(self):
+        try:
+            response = requests.get(self.report_job['status_url'], headers=self.auth_header, timeout=10)
+            if response.status_code != 200:
+                raise Exception(response.json().get('error', f"HTTP {response.status_code}"))
+            self.report_job = response.json()
+            
+            if self.report_job['status'] == 'done':
+                self.save_report(self.report_job['download_url'])
+            elif self.report_job['status'] == 'failed':
+                raise Exception(self.report_job['error'] or "Report job failed")
+            elif time.monotonic() > self.report_deadline:
+                raise Exception("Timed out waiting for the report")
+            else:
+                self.statusBar().showMessage(f"Generating PDF report ({self.report_job['status']})...")
+                QTimer.singleShot(REPORT_POLL_INTERVAL_MS, self.poll_report_job)
+                return
+        
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"Failed to generate PDF report: {str(e)}")
+            self.statusBar().showMessage("PDF generation failed")
+        
+        self.pdf_btn.setEnabled(bool(self.selected_dataset_id))
+    
+    def save_report(self, download_url):
+        response = requests.get(download_url, headers=self.auth_header, timeout=60)
+        if response.status_code != 200:
+            raise Exception(f"Download failed (HTTP {response.status_code})")
+        
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save PDF Report", 
+                                                 f"equipment_report_{self.selected_dataset_id}.pdf", 
+                                                 "PDF Files (*.pdf)")
+        if file_path:
+            with open(file_path, 'wb') as f:
+                f.write(response.content)
+            QMessageBox.information(self, "Success", f"PDF report saved successfully!\\n\\nSaved to: {file_path}")
+            self.statusBar().showMessage("PDF report saved")
 
 def main():
     app = QApplication(sys.argv)